@@ -0,0 +1,2 @@
+from .positions import POSITIONS, position
+from .suite import BENCHMARKS, compare, run
@@ -0,0 +1,27 @@
+import random
+from simulation.runner import new_game
+
+
+# The positions benchmarked are reached by playing random placements for all
+# four players on a fixed seed, so they are the same on every run. Each is
+# given as (seed, placements), the number of placements made before it.
+
+POSITIONS = {
+    "opening": (1, 4),
+    "midgame": (2, 32),
+    "endgame": (3, 60),
+}
+
+
+def position(name):
+    """
+    Returns the game of a named position, with the player to
+    move first in the list of players.
+    """
+    (seed, placements) = POSITIONS[name]
+    random.seed(seed)
+    game = new_game([("random", [1, 1])] * 4)
+    game.play()
+    while len(game.board.history) < placements and game.winner() == "None":
+        game.play()
+    return game
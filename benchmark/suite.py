@@ -0,0 +1,217 @@
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from objects.moves import MoveCache
+from objects.player import eval_move, eval_moves
+from simulation.runner import STRATEGIES, play_game
+from strategies import endgame, minimax
+from .positions import POSITIONS, position
+
+
+# Every benchmark is a function of a position's game that does its work once
+# and returns how many things it did (placements generated, games played...),
+# so a run can be reported as a throughput. It is run a number of times and
+# the fastest run is kept, as the slower ones only measure other work on the
+# machine. The peak memory is taken from one more run under tracemalloc.
+#
+#     python -m benchmark --out after.json --compare before.json
+#
+# A benchmark is flagged as a regression when it is slower than in the run
+# compared with by more than the tolerance, and the command then exits with 1.
+
+WEIGHTS = {
+    "greedy": [2, 1],
+    "random": [1, 1],
+    "minimax": [2, 1, 5, 1, 1, 2, 2],
+    "maxn": [2, 1, 5, 1, 1, 2, 2],
+    "mcts": [100, 0, 1],
+}
+
+
+def possible_moves(game):
+    """
+    Generates every placement of the player to move, from scratch.
+    """
+    player = game.players[0]
+    player.moves = MoveCache()
+    return len(player.possible_moves(player.pieces, game))
+
+
+def cached_moves(game):
+    """
+    Generates every placement of the player to move, from its cache.
+    """
+    player = game.players[0]
+    return len(player.possible_moves(player.pieces, game))
+
+
+def valid_move(game):
+    player = game.players[0]
+    placements = player.possible_moves(player.pieces, game)
+    for placement in placements:
+        game.valid_move(player, placement.points)
+    return len(placements)
+
+
+def single_eval(game):
+    player = game.players[0]
+    placements = player.possible_moves(player.pieces, game)
+    for placement in placements:
+        eval_move(placement, player, game, WEIGHTS["greedy"])
+    return len(placements)
+
+
+def batch_eval(game):
+    player = game.players[0]
+    placements = player.possible_moves(player.pieces, game)
+    eval_moves(placements, player, game, WEIGHTS["greedy"])
+    return len(placements)
+
+
+def do_move(strategy):
+    """
+    Returns a benchmark of one move of a strategy.
+    """
+    def benchmark(game):
+        player = game.players[0]
+        # no table kept from an earlier run
+        minimax.TABLES.clear()
+        random.seed(0)
+        STRATEGIES[strategy](player, game, WEIGHTS[strategy])
+        return 1
+    return benchmark
+
+
+def endgame_solve(game):
+    """
+    Solves the rest of the game exactly for the player to move.
+    """
+    player = game.players[0]
+    solver = endgame.Endgame(seconds=None)
+    solver.solve(player, game)
+    return solver.nodes
+
+
+def full_games(strategy, games=2):
+    """
+    Returns a benchmark of whole games between four players of a strategy.
+    """
+    def benchmark(game):
+        for seed in range(games):
+            play_game([(strategy, WEIGHTS[strategy])] * 4, seed)
+        return games
+    return benchmark
+
+
+# name: (benchmark, positions, unit of what it returns)
+BENCHMARKS = {
+    "possible_moves": (possible_moves, list(POSITIONS), "placements"),
+    "cached_moves": (cached_moves, list(POSITIONS), "placements"),
+    "valid_move": (valid_move, list(POSITIONS), "placements"),
+    "eval_move": (single_eval, list(POSITIONS), "placements"),
+    "eval_moves": (batch_eval, list(POSITIONS), "placements"),
+    "do_move_greedy": (do_move("greedy"), list(POSITIONS), "moves"),
+    "do_move_random": (do_move("random"), list(POSITIONS), "moves"),
+    "do_move_minimax": (do_move("minimax"), ["midgame", "endgame"], "moves"),
+    "do_move_maxn": (do_move("maxn"), ["midgame", "endgame"], "moves"),
+    "do_move_mcts": (do_move("mcts"), ["midgame"], "moves"),
+    "endgame_solve": (endgame_solve, ["endgame"], "nodes"),
+    "games_greedy": (full_games("greedy"), [None], "games"),
+    "games_random": (full_games("random"), [None], "games"),
+}
+
+
+def measure(benchmark, game, repeat):
+    """
+    Returns (seconds of the fastest run, count, peak bytes) of a benchmark.
+    """
+    best = None
+    for i in range(repeat):
+        tic = time.perf_counter()
+        count = benchmark(game)
+        toc = time.perf_counter()
+        best = toc - tic if best is None else min(best, toc - tic)
+
+    tracemalloc.start()
+    benchmark(game)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return (best, count, peak)
+
+
+def run(names=None, repeat=5):
+    """
+    Runs the named benchmarks (all of them by default) and returns their
+    results by "benchmark/position".
+    """
+    games = {}
+    results = {}
+    for name in names or BENCHMARKS:
+        (benchmark, positions, unit) = BENCHMARKS[name]
+        for pos in positions:
+            if pos not in games:
+                games[pos] = position(pos) if pos else None
+            (seconds, count, peak) = measure(benchmark, games[pos], repeat)
+            key = name if pos is None else name + "/" + pos
+            results[key] = {
+                "seconds": seconds,
+                "count": count,
+                "unit": unit,
+                "per_second": count / seconds if seconds else None,
+                "peak_kb": peak / 1024,
+            }
+    return results
+
+
+def compare(results, baseline, tolerance=0.1):
+    """
+    Returns the benchmarks of results slower than in baseline by more than
+    the tolerance, as (name, old seconds per item, new seconds per item).
+    """
+    slower = []
+    for (key, new) in results.items():
+        old = baseline.get(key)
+        if old is None or not new["count"] or not old["count"]:
+            continue
+        (before, after) = (old["seconds"] / old["count"], new["seconds"] / new["count"])
+        if after > before * (1 + tolerance):
+            slower.append((key, before, after))
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmark",
+                                     description="Times move generation, evaluation, strategies and whole games.")
+    parser.add_argument("names", nargs="*", metavar="benchmark",
+                        help="benchmarks to run (all of them by default): " + ", ".join(BENCHMARKS))
+    parser.add_argument("--repeat", type=int, default=5, help="runs of every benchmark, the fastest is kept")
+    parser.add_argument("--out", help="JSON file to save the results to")
+    parser.add_argument("--compare", help="JSON file of an earlier run to flag regressions against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="share by which a benchmark may be slower")
+    args = parser.parse_args(argv)
+    for name in args.names:
+        if name not in BENCHMARKS:
+            parser.error("unknown benchmark " + name)
+
+    results = run(args.names, args.repeat)
+    for (key, r) in results.items():
+        print(f"{key:28} {r['seconds'] * 1000:10.2f} ms {r['per_second']:12.1f} {r['unit']}/s {r['peak_kb']:10.1f} KB")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"python": platform.python_version(), "machine": platform.machine(),
+                       "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "repeat": args.repeat,
+                       "results": results}, f, indent=1)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        slower = compare(results, baseline, args.tolerance)
+        for (key, before, after) in slower:
+            print(f"regression: {key} {before * 1000:.3f} -> {after * 1000:.3f} ms per item")
+        if slower:
+            sys.exit(1)
@@ -0,0 +1,36 @@
+from .game import Game
+
+
+# Blokus is the Game with the rules of Blokus: a player's first piece must
+# cover its starting corner, and every later piece must touch one of the
+# player's own pieces at a corner and never along an edge. The game is won
+# once no player can place a piece, by the player with the highest score.
+
+class Blokus(Game):
+
+    def __init__(self, players, board, all_pieces):
+        Game.__init__(self, players, board, all_pieces)
+        # the name of the winner, kept once the game is over
+        self.result = None
+
+    def winner(self):
+        if self.result is None:
+            # stop at the first player that can still place a piece
+            if any(p.has_legal_move(self) for p in self.players):
+                return "None"
+            cand = [(p.score, p.name) for p in self.players]
+            self.result = sorted(cand, reverse=True)[0][1]
+        return self.result
+
+    def valid_move(self, player, move):
+        mask = self.board.mask(move)
+        if mask is None:
+            return False
+        return self.valid_mask(player, mask)
+
+    def valid_mask(self, player, mask):
+        if self.rounds < len(self.players):
+            return (not (self.board.filled & mask)
+                    and bool(mask & (self.board.mask(player.corners) or 0)))
+
+        return self.board.fits(player, mask)
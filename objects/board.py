@@ -1,4 +1,5 @@
-from matplotlib import pyplot as plt
+from .render import board_array, draw
+from .zobrist import cell_key, piece_key, turn_key
 
 
 class Board:
@@ -7,6 +8,12 @@ class Board:
     m columns with an empty space represented
     by a character string according to null of
     character length one.
+
+    Alongside the grid of characters, the board keeps
+    each player's occupancy as an integer bitmask where
+    the point (x, y) is bit y * stride + x. The stride has
+    one column of padding, so shifting a mask by one bit
+    never wraps a piece around onto the next row.
     """
 
     def __init__(self, n, m, null):
@@ -14,16 +21,169 @@ class Board:
         self.null = null
         self.empty = [[self.null] * m for i in range(n)]
         self.state = self.empty
+        self.stride = m + 1
+        # mask of every point that is on the board (no padding)
+        self.cells = sum(1 << (j * self.stride + i) for j in range(n) for i in range(m))
+        # mask of every point covered by any player
+        self.filled = 0
+        # per player label: points covered by the player, points the player
+        # can no longer cover (its own points and their edge neighbours), and
+        # empty points diagonal to the player's pieces that it may still cover
+        self.occupied = {}
+        self.forbidden = {}
+        self.anchors = {}
+        # placements made through apply, most recent last, with what
+        # they changed so that undo can take them back
+        self.journal = []
+        # (label, mask) of every placement on the board, most recent last
+        self.history = []
+        # orientation index -> (bounding box, mask at the origin) on this board
+        self.shapes = {}
+        # Zobrist key of the covered cells and the pieces played
+        self.key = 0
+        # reaches of the players kept up to date with the placements, if
+        # given one (see territory.py)
+        self.territory = None
 
-    def update(self, player, move):
+    def update(self, player, move, ID=None):
         """
         Takes in a Player object and a move as a
-        list of integer tuples that represent the piece.
+        list of integer tuples that represent the piece,
+        and the ID of the piece if it is known.
+        """
+        for (col, row) in move:
+            self.state[row][col] = player.label
+        mask = self.mask(move)
+        self.place(player.label, mask)
+        self.history.append((player.label, mask))
+        self.key ^= self.placement_key(player.label, move, ID)
+
+    def load(self, history, key):
+        """
+        Places every (label, mask) placement of a history, as kept by
+        another board, and takes on that board's Zobrist key.
+        """
+        for (label, mask) in history:
+            for (col, row) in self.points(mask):
+                self.state[row][col] = label
+            self.place(label, mask)
+            self.history.append((label, mask))
+        self.key = key
+
+    def placement_key(self, label, move, ID=None):
+        """
+        Returns the Zobrist key that a placement of the piece with the
+        given ID, covering the points of move, XORs into the board's key.
+        """
+        key = piece_key(label, ID) if ID is not None else 0
+        for (i, j) in move:
+            key ^= cell_key(label, j * self.stride + i)
+        return key
+
+    def state_key(self, label):
+        """
+        Returns the Zobrist key of the position with the player
+        with the given label to move.
+        """
+        return self.key ^ turn_key(label)
+
+    def apply(self, player, placement):
+        """
+        Places a placement (Shape object) for a player in place,
+        recording what it changes so that undo can take it back.
+        """
+        label = player.label
+        self.journal.append((label, placement.points, self.filled, self.occupied.get(label, 0),
+                             self.forbidden.get(label, 0), dict(self.anchors), self.key))
+        self.update(player, placement.points, placement.ID)
+
+    def undo(self):
+        """
+        Takes back the most recent placement made through apply.
+        """
+        label, points, self.filled, occupied, forbidden, self.anchors, self.key = self.journal.pop()
+        self.occupied[label] = occupied
+        self.forbidden[label] = forbidden
+        self.history.pop()
+        for (col, row) in points:
+            self.state[row][col] = self.null
+        if self.territory is not None:
+            self.territory.undo()
+
+    def place(self, label, mask):
+        """
+        Updates the bitmasks of every player with a placement,
+        given as a mask, by the player with the given label.
+        """
+        self.filled |= mask
+        self.occupied[label] = self.occupied.get(label, 0) | mask
+        self.forbidden[label] = self.forbidden.get(label, 0) | mask | self.edges(mask)
+        for other in self.anchors:
+            self.anchors[other] &= ~mask
+        self.anchors[label] = ((self.anchors.get(label, 0) | self.diagonals(mask))
+                               & ~self.forbidden[label] & ~self.filled)
+        if self.territory is not None:
+            self.territory.place(label, mask)
+
+    def mask(self, move):
+        """
+        Takes in a list of integer tuples and returns the bitmask
+        of those points, or None if any of them is out of bounds.
+        """
+        mask = 0
+        for (i, j) in move:
+            if not ((0 <= i < self.size[1]) and (0 <= j < self.size[0])):
+                return None
+            mask |= 1 << (j * self.stride + i)
+        return mask
+
+    def placement_mask(self, orientation, pt, num):
+        """
+        Returns the bitmask of an Orientation placed so that its point num
+        lies on pt, or None if the placement is out of bounds. The mask is
+        one shift of a mask computed once per orientation.
         """
-        for row in range(len(self.state)):
-            for col in range(len(self.state[1])):
-                if (col, row) in move:
-                    self.state[row][col] = player.label
+        if orientation.index not in self.shapes:
+            xs = [i for (i, j) in orientation.points]
+            ys = [j for (i, j) in orientation.points]
+            box = (min(xs), min(ys), max(xs), max(ys))
+            origin = sum(1 << ((j - box[1]) * self.stride + (i - box[0])) for (i, j) in orientation.points)
+            self.shapes[orientation.index] = (box, origin)
+
+        (min_x, min_y, max_x, max_y), origin = self.shapes[orientation.index]
+        x = pt[0] - orientation.points[num][0]
+        y = pt[1] - orientation.points[num][1]
+        if x + min_x < 0 or y + min_y < 0 or x + max_x >= self.size[1] or y + max_y >= self.size[0]:
+            return None
+        return origin << ((y + min_y) * self.stride + x + min_x)
+
+    def points(self, mask):
+        """
+        Returns the list of integer tuples covered by a bitmask.
+        """
+        points = []
+        while mask:
+            low = mask & -mask
+            j, i = divmod(low.bit_length() - 1, self.stride)
+            points.append((i, j))
+            mask ^= low
+        return points
+
+    def edges(self, mask):
+        """
+        Returns the mask of the points on the board that share
+        an edge with a point of the given mask.
+        """
+        s = self.stride
+        return ((mask << 1) | (mask >> 1) | (mask << s) | (mask >> s)) & self.cells
+
+    def diagonals(self, mask):
+        """
+        Returns the mask of the points on the board that are
+        diagonal to a point of the given mask.
+        """
+        s = self.stride
+        return ((mask << (s + 1)) | (mask << (s - 1)) | (mask >> (s - 1)) | (mask >> (s + 1))) & self.cells
 
     def in_bounds(self, point):
         """
@@ -37,10 +197,7 @@ class Board:
         Returns a boolean for whether a move is overlapping
         any pieces that have already been placed on the board.
         """
-        if False in [(self.state[j][i] == self.null) for (i, j) in move]:
-            return True
-        else:
-            return False
+        return bool(self.filled & self.mask([pt for pt in move if self.in_bounds(pt)]))
 
     def corner(self, player, move):
         """
@@ -48,25 +205,8 @@ class Board:
         function returns a boolean; whether the move is cornering
         any pieces of the player proposing the move.
         """
-        validates = []
-
-        for (i, j) in move:
-            if self.in_bounds((j + 1, i + 1)):
-                validates.append((self.state[j + 1][i + 1] == player.label))
-
-            if self.in_bounds((j - 1, i - 1)):
-                validates.append((self.state[j - 1][i - 1] == player.label))
-
-            if self.in_bounds((j - 1, i + 1)):
-                validates.append((self.state[j - 1][i + 1] == player.label))
-
-            if self.in_bounds((j + 1, i - 1)):
-                validates.append((self.state[j + 1][i - 1] == player.label))
-
-        if True in validates:
-            return True
-        else:
-            return False
+        own = self.occupied.get(player.label, 0)
+        return bool(self.diagonals(own) & self.mask([pt for pt in move if self.in_bounds(pt)]))
 
     def adj(self, player, move):
         """
@@ -74,25 +214,18 @@ class Board:
         the board which are occupied by the player
         proposing the move and returns a boolean.
         """
-        validates = []
-
-        for (i, j) in move:
-            if self.in_bounds((j, i + 1)):
-                validates.append((self.state[j][i + 1] == player.label))
-
-            if self.in_bounds((j, i - 1)):
-                validates.append((self.state[j][i - 1] == player.label))
+        own = self.occupied.get(player.label, 0)
+        return bool(self.edges(own) & self.mask([pt for pt in move if self.in_bounds(pt)]))
 
-            if self.in_bounds((j - 1, i)):
-                validates.append((self.state[j - 1][i] == player.label))
-
-            if self.in_bounds((j + 1, i)):
-                validates.append((self.state[j + 1][i] == player.label))
-
-        if True in validates:
-            return True
-        else:
-            return False
+    def fits(self, player, mask):
+        """
+        Returns a boolean for whether a placement, given as a mask,
+        covers no pieces, shares no edge with the player's own pieces
+        and covers at least one of the player's anchors.
+        """
+        label = player.label
+        return (not (mask & (self.filled | self.forbidden.get(label, 0)))
+                and bool(mask & self.anchors.get(label, 0)))
 
     def print_board(self, num=None, fancy=False):
         if not fancy:
@@ -113,48 +246,11 @@ def print_board(board):
 
 
 # This function uses MatplotLib to create a fancy image of the board that opens in a separate window.
+# The board is drawn as one image (see render.py); use render.Renderer to draw boards without a window.
+# MatplotLib is only imported here, so that games played without it never load it.
 def fancy_board(board):
-    a_points = []
-    b_points = []
-    c_points = []
-    d_points = []
-
-    for y in enumerate(board.state):
-        for x in enumerate(y[1]):
-            if x[1] == "A":
-                a_points.append((x[0], (board.size[0] - 1) - y[0]))
-            if x[1] == "B":
-                b_points.append((x[0], (board.size[0] - 1) - y[0]))
-            if x[1] == "C":
-                c_points.append((x[0], (board.size[0] - 1) - y[0]))
-            if x[1] == "D":
-                d_points.append((x[0], (board.size[0] - 1) - y[0]))
-
-    # fig = plt.figure(frameon=False)
-    ax = plt.subplot(111, xlim=(0, board.size[0]), ylim=(0, board.size[1]))
-
-    for i in range(board.size[0] + 1):
-        for j in range(board.size[1] + 1):
-            polygon = plt.Polygon([[i, j], [i + 1, j], [i + 1, j + 1], [i, j + 1], [i, j]])
-            if (i, j) in a_points:
-                polygon.set_facecolor('red')
-                ax.add_patch(polygon)
-            elif (i, j) in b_points:
-                polygon.set_facecolor('blue')
-                ax.add_patch(polygon)
-            elif (i, j) in c_points:
-                polygon.set_facecolor('green')
-                ax.add_patch(polygon)
-            elif (i, j) in d_points:
-                polygon.set_facecolor('yellow')
-                ax.add_patch(polygon)
-            else:
-                polygon.set_facecolor('lightgrey')
-                ax.add_patch(polygon)
-
-    for axis in (ax.xaxis, ax.yaxis):
-        axis.set_major_formatter(plt.NullFormatter())
-        axis.set_major_locator(plt.NullLocator())
-
-    # plt.savefig("random" + str(num) + ".png")
+    from matplotlib import pyplot as plt
+
+    fig, ax = plt.subplots()
+    draw(ax, board_array(board))
     plt.show()
@@ -0,0 +1,154 @@
+import json
+import mmap
+import struct
+from .record import decode, encode
+from .symmetry import canonical_game, canonical_key, restore, transform_points
+
+# Here we implement an opening book: the placement to make in positions of
+# the first plies of a game, found offline by deep searches or from the
+# results of many games (see simulation/book.py). Positions are kept by the
+# Zobrist key of their canonical form (see symmetry.py), so a position turned,
+# mirrored or played by other colours is found under the same entry, and the
+# placement is kept in the canonical frame as the integer of a placement of a
+# game record (see record.py) by the player to move.
+#
+# A book file is a header of JSON (the board size, the number of players, the
+# plies covered and how the book was made), then the entries sorted by key:
+#
+#     b"BLKB" | version (1 byte) | header length (4 bytes) | header
+#     | number of entries (8 bytes) | entries (20 bytes each)
+#
+# where every entry is its key (8 bytes), placement (4 bytes), the number of
+# games it was played in (4 bytes, 0 when it was found by search) and its
+# value (a 4 byte float: its share of the wins over those games, or the
+# score the search gave it). All integers are little-endian. Books are read
+# through a memory map, and an entry is found by binary search, so opening a
+# book costs nothing whatever its size.
+
+VERSION = 1
+MAGIC = b"BLKB"
+HEADER = struct.Struct("<4sBI")
+COUNT = struct.Struct("<Q")
+ENTRY = struct.Struct("<QIIf")
+# books opened so far, by path, so that every game of a worker shares one
+LOADED = {}
+
+
+def write_book(path, entries, size, **header):
+    """
+    Writes a book file of entries, a dictionary of key -> (placement,
+    games, value), for a board of the given size.
+    """
+    header["size"] = list(size)
+    text = json.dumps(header, separators=(",", ":")).encode()
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(text)) + text + COUNT.pack(len(entries)))
+        for key in sorted(entries):
+            f.write(ENTRY.pack(key, *entries[key]))
+
+
+class OpeningBook:
+    """
+    Reads the entries of a book file through a memory map of the file.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, length) = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(path + " is not an opening book of version " + str(VERSION))
+        self.header = json.loads(bytes(self.data[HEADER.size:HEADER.size + length]))
+        self.size = tuple(self.header["size"])
+        self.plies = self.header.get("plies")
+        (self.count,) = COUNT.unpack_from(self.data, HEADER.size + length)
+        self.start = HEADER.size + length + COUNT.size
+
+    def __len__(self):
+        return self.count
+
+    def entry(self, i):
+        return ENTRY.unpack_from(self.data, self.start + i * ENTRY.size)
+
+    def get(self, key):
+        """
+        Returns (placement, games, value) of the entry with the given
+        key, or None if there is none.
+        """
+        (lo, hi) = (0, self.count)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            (other, placement, games, value) = self.entry(mid)
+            if other == key:
+                return placement, games, value
+            if other < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self.entry(i)
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def load(path):
+    """
+    Returns the book in a file, opening it only once.
+    """
+    if path not in LOADED:
+        LOADED[path] = OpeningBook(path)
+    return LOADED[path]
+
+
+def book_key(game):
+    """
+    Returns the key of a game's position with the first of its players to
+    move, and the transform that takes the position to its canonical form.
+    """
+    (form, transform, order) = canonical_game(game)
+    return canonical_key(form), transform
+
+
+def book_code(points, transform, size):
+    """
+    Returns the integer a placement of the player to move is kept as in a book.
+    """
+    return encode("A", transform_points(points, transform, size), size)
+
+
+def book_move(player, game):
+    """
+    Returns the placement the player's book (player.book) gives for the
+    game's position, or None if it has none.
+    """
+    book = player.book
+    board = game.board
+    if (book is None or board.size != book.size or game.players[0] is not player
+            or (book.plies is not None and len(board.history) >= book.plies)):
+        return None
+    (key, transform) = book_key(game)
+    entry = book.get(key)
+    if entry is None:
+        game.metrics.count("book.misses")
+        return None
+    (label, index, points) = decode(entry[0], board.size)
+    target = board.mask(restore(points, transform, board.size))
+    for piece in player.possible_moves(player.pieces, game):
+        if board.mask(piece.points) == target:
+            game.metrics.count("book.hits")
+            return piece
+    # a placement that is not legal here: the key was shared by chance
+    game.metrics.count("book.misses")
+    return None
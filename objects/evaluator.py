@@ -0,0 +1,191 @@
+import numpy as np
+from .player import Evaluator
+from .render import mask_array
+
+# Here we implement learned evaluators: a linear model and a small multilayer
+# perceptron, in plain NumPy, over features of every candidate placement.
+# The features of all the candidates of a position are computed together
+# from the cell and corner arrays laid out by eval_moves, so scoring them is
+# a few array operations and one matrix multiply per layer, whatever their
+# number.
+#
+# The features, in the order of FEATURES, are:
+#
+# - size: the number of squares of the placement.
+# - created: the anchors (empty cells diagonal to the player's pieces that
+#   it may cover) the placement adds for its player.
+# - covered: the player's own anchors the placement uses up.
+# - blocked: the anchors of the opponents the placement covers, added up.
+# - reach: the free cells around the new anchors, added up over them: for
+#   each anchor, the share of the 5 by 5 square around it that is empty
+#   and not next to the player's pieces.
+# - centre: how near the middle of the board the placement is, from 0 at
+#   the edge to 1 at the middle, averaged over its squares.
+# - share: the size of the placement over the size of the player's largest
+#   piece left.
+# - remaining: the squares the player has left to place, over 89.
+# - anchors: the anchors the player has before the placement, over 20.
+# - phase: the pieces placed so far by all players, over 21 for every player.
+#
+# The last three are the same for every candidate of a position; they only
+# matter to the MLP, which can weigh the others differently as the game goes.
+# Anchors are read from the board's masks (see Board.place), so the features
+# of a position rebuilt from its masks alone, as when training on self-play
+# data, are the same as during the game.
+
+FEATURES = ["size", "created", "covered", "blocked", "reach", "centre", "share", "remaining", "anchors", "phase"]
+REACH = 2
+# nearness to the middle of every cell (and 0 for the sentinel), by board size
+CENTRES = {}
+
+
+def centre_table(size):
+    if size not in CENTRES:
+        (n, m) = size
+        (y, x) = np.mgrid[0:n, 0:m]
+        centre = np.zeros(n * m + 1)
+        centre[:n * m] = (1 - np.maximum(np.abs(x - (m - 1) / 2) / (m / 2), np.abs(y - (n - 1) / 2) / (n / 2))).ravel()
+        CENTRES[size] = centre
+    return CENTRES[size]
+
+
+def anchor_table(board, player):
+    """
+    Returns a boolean array over the cells (and one sentinel past them)
+    that is True at the anchors of the player.
+    """
+    (n, m) = board.size
+    table = np.zeros(n * m + 1, dtype=bool)
+    if player.label in board.anchors:
+        table[:n * m] = mask_array(board.anchors[player.label], board.size).ravel()
+    else:
+        # no piece placed yet: the start corner is the only anchor
+        for (i, j) in player.free_corners(board):
+            table[j * m + i] = True
+    return table
+
+
+def features(cells, corners, player, game):
+    """
+    Returns the (candidates, len(FEATURES)) array of the features of the
+    candidates, given as the cell and corner arrays of eval_moves.
+    """
+    board = game.board
+    (n, m) = board.size
+    sentinel = n * m
+    opponents = [opponent for opponent in game.players if opponent.label != player.label]
+
+    mine = anchor_table(board, player)
+    theirs = np.zeros(sentinel + 1, dtype=np.int64)
+    for opponent in opponents:
+        theirs += anchor_table(board, opponent)
+
+    filled = mask_array(board.filled, board.size)
+    forbidden = mask_array(board.forbidden.get(player.label, 0), board.size)
+    free = np.zeros(sentinel + 1, dtype=bool)
+    free[:sentinel] = (~filled & ~forbidden).ravel()
+
+    # share of free cells in the square around every cell
+    side = 2 * REACH + 1
+    padded = np.pad(free[:sentinel].reshape(n, m).astype(np.int64), ((REACH + 1, REACH), (REACH + 1, REACH)))
+    sums = padded.cumsum(axis=0).cumsum(axis=1)
+    window = (sums[side:, side:] - sums[:-side, side:] - sums[side:, :-side] + sums[:-side, :-side]) / side ** 2
+    reach = np.zeros(sentinel + 1)
+    reach[:sentinel] = window.ravel()
+
+    centre = centre_table(board.size)
+
+    on_board = cells != sentinel
+    sizes = on_board.sum(axis=1)
+    inside = (corners[:, :, None] == cells[:, None, :]).any(axis=2)
+    created = free[corners] & ~mine[corners] & ~inside
+    left = [piece.size for piece in player.pieces] or [1]
+
+    table = np.empty((len(cells), len(FEATURES)))
+    table[:, 0] = sizes
+    table[:, 1] = created.sum(axis=1)
+    table[:, 2] = mine[cells].sum(axis=1)
+    table[:, 3] = theirs[cells].sum(axis=1)
+    table[:, 4] = (reach[corners] * created).sum(axis=1)
+    table[:, 5] = centre[cells].sum(axis=1) / np.maximum(sizes, 1)
+    table[:, 6] = sizes / max(left)
+    table[:, 7] = sum(left) / 89
+    table[:, 8] = mine.sum() / 20
+    table[:, 9] = sum(21 - len(p.pieces) for p in game.players) / (21 * len(game.players))
+    return table
+
+
+class LinearEvaluator(Evaluator):
+    """
+    Scores candidates by a weighted sum of their standardized features.
+    """
+
+    kind = "linear"
+
+    def __init__(self, mean, scale, w, b):
+        self.mean = np.asarray(mean, dtype=float)
+        self.scale = np.asarray(scale, dtype=float)
+        self.w = np.asarray(w, dtype=float)
+        self.b = float(b)
+
+    def predict(self, table):
+        return ((table - self.mean) / self.scale) @ self.w + self.b
+
+    def score_cells(self, cells, corners, player, game, weights):
+        return self.predict(features(cells, corners, player, game))
+
+    def params(self):
+        return {"mean": self.mean, "scale": self.scale, "w": self.w, "b": np.array(self.b)}
+
+
+class MLPEvaluator(Evaluator):
+    """
+    Scores candidates with one hidden layer of rectified linear units
+    over their standardized features.
+    """
+
+    kind = "mlp"
+
+    def __init__(self, mean, scale, w1, b1, w2, b2):
+        self.mean = np.asarray(mean, dtype=float)
+        self.scale = np.asarray(scale, dtype=float)
+        self.w1 = np.asarray(w1, dtype=float)
+        self.b1 = np.asarray(b1, dtype=float)
+        self.w2 = np.asarray(w2, dtype=float)
+        self.b2 = float(b2)
+
+    def predict(self, table):
+        hidden = np.maximum(((table - self.mean) / self.scale) @ self.w1 + self.b1, 0)
+        return hidden @ self.w2 + self.b2
+
+    def score_cells(self, cells, corners, player, game, weights):
+        return self.predict(features(cells, corners, player, game))
+
+    def params(self):
+        return {"mean": self.mean, "scale": self.scale, "w1": self.w1, "b1": self.b1,
+                "w2": self.w2, "b2": np.array(self.b2)}
+
+
+KINDS = {"linear": LinearEvaluator, "mlp": MLPEvaluator}
+# evaluators loaded so far, by path, so that every game of a worker shares one
+LOADED = {}
+
+
+def save(evaluator, path):
+    """
+    Writes an evaluator to a .npz file.
+    """
+    np.savez(path, kind=evaluator.kind, features=np.array(FEATURES), **evaluator.params())
+
+
+def load(path):
+    """
+    Returns the evaluator saved in a .npz file, loading it only once.
+    """
+    if path not in LOADED:
+        data = np.load(path)
+        if list(data["features"]) != FEATURES:
+            raise ValueError(path + " was trained on other features")
+        params = {key: data[key] for key in data.files if key not in ("kind", "features")}
+        LOADED[path] = KINDS[str(data["kind"])](**params)
+    return LOADED[path]
@@ -18,6 +18,22 @@
 # played. Finally, the Game gives players the chance to play
 # cyclically, starting with the first player in the list of players
 # when the Game is instantiated.
+#
+# What happens during the game is reported to game.metrics
+# (see metrics.py), which ignores it unless it is replaced.
+
+from .metrics import NULL
+
+
+def start_corners(size):
+    """
+    Returns the start corners of the players on a board of
+    the given size, in the order the players first play.
+    """
+    max_x = (size[1] - 1)
+    max_y = (size[0] - 1)
+    return [(0, 0), (max_y, max_x), (0, max_x), (max_y, 0)]
+
 
 class Game:
     """
@@ -32,6 +48,8 @@ class Game:
         self.rounds = 0
         self.board = board
         self.all_pieces = all_pieces
+        # receives the counters, timers and events of the game and its players
+        self.metrics = NULL
 
     def winner(self):
         """
@@ -50,6 +68,26 @@ class Game:
         """
         return True
 
+    def valid_mask(self, player, mask):
+        """
+        Uses the board's bitmasks to see whether a player's
+        proposed move, given as a bitmask, is valid.
+        """
+        return True
+
+    def start(self):
+        """
+        Gives the players their pieces and a corner to start,
+        as the game must when it has not begun yet.
+        """
+        starts = start_corners(self.board.size)
+        for i in range(len(self.players)):
+            (self.players[i]).add_pieces(self.all_pieces)
+            (self.players[i]).start_corner(starts[i])
+        for player in self.players:
+            if player.evaluator is not None:
+                player.evaluator.start(self)
+
     def play(self):
         """
         Plays a list of Player objects sequentially,
@@ -58,23 +96,21 @@ class Game:
         instantiation.
         """
         if self.rounds == 0:
-            # When the game has not begun yet, the game must
-            # give the players their pieces and a corner to start.
-            max_x = (self.board.size[1] - 1)
-            max_y = (self.board.size[0] - 1)
-            starts = [(0, 0), (max_y, max_x), (0, max_x), (max_y, 0)]
+            self.start()
 
-            for i in range(len(self.players)):
-                (self.players[i]).add_pieces(self.all_pieces)
-                (self.players[i]).start_corner(starts[i])
-
-        # if there is no winner, print out the current player's name and
+        # if there is no winner, report the current player's turn and
         # let current player perform a move
         if self.winner() == "None":
             current = self.players[0]
-            print("Current player: " + current.name)
-            proposal = current.do_move(self, current.weights)
+            self.metrics.event("turn", player=current.name)
+            # a player known to be out of moves passes without being asked
+            if current.finished:
+                proposal = None
+            else:
+                with self.metrics.timer("move"):
+                    proposal = current.do_move(self, current.weights)
             if proposal is None:
+                self.metrics.count("passes")
                 # move on to next player, increment rounds
                 first = self.players.pop(0)
                 self.players = self.players + [first]
@@ -82,8 +118,9 @@ class Game:
 
             # ensure that the proposed move is valid
             elif self.valid_move(current, proposal.points):
+                self.metrics.count("placements")
                 # update the board with the move
-                self.board.update(current, proposal.points)
+                self.board.update(current, proposal.points, proposal.ID)
                 # let the player update itself accordingly
                 current.update_player(proposal, self.board)
                 # remove the piece that was played from the player
@@ -99,4 +136,4 @@ class Game:
                 raise Exception("Invalid move by " + current.name + ".")
 
         else:
-            print("Game over! And the winner is: " + self.winner())
+            self.metrics.event("game_over", winner=self.winner())
@@ -0,0 +1,158 @@
+import json
+import sys
+import time
+
+
+# The Game and the strategies report what they do through a Metrics object,
+# kept as game.metrics, instead of printing it. There are three kinds of
+# measurements:
+#
+# - counters, such as the nodes searched or the placements generated,
+#   added to with count(name, n).
+# - timers, the seconds taken by a phase, given to time(name, seconds)
+#   or measured around a block with `with metrics.timer(name):`.
+# - events, such as a turn starting or the game ending, with fields.
+#
+# The base Metrics drops all of them and is the default, so that a game
+# played without anyone watching pays for little more than the calls.
+# Collector adds them up in memory, JSONLWriter writes every one of them as
+# a line of JSON, and Console prints them as the game used to.
+
+class Metrics:
+    """
+    Receives counters, timers and events and does nothing with them.
+    """
+
+    def count(self, name, n=1):
+        pass
+
+    def time(self, name, seconds):
+        pass
+
+    def event(self, name, **fields):
+        pass
+
+    def timer(self, name):
+        """
+        Returns a context manager that times its block under name.
+        """
+        return Timer(self, name)
+
+
+class NullMetrics(Metrics):
+    """
+    Metrics that measures nothing, not even the time of a block.
+    """
+
+    def timer(self, name):
+        return NULL_TIMER
+
+
+class Timer:
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+        self.tic = None
+
+    def __enter__(self):
+        self.tic = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.time(self.name, time.perf_counter() - self.tic)
+        return False
+
+
+class NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_TIMER = NullTimer()
+NULL = NullMetrics()
+
+
+class Collector(Metrics):
+    """
+    Adds up counters, and the number, total and longest of every timer,
+    and counts events by name.
+    """
+
+    def __init__(self):
+        self.counters = {}
+        # name: [number of times, total seconds, longest seconds]
+        self.timers = {}
+        self.events = {}
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def time(self, name, seconds):
+        timer = self.timers.get(name)
+        if timer is None:
+            self.timers[name] = [1, seconds, seconds]
+        else:
+            timer[0] += 1
+            timer[1] += seconds
+            timer[2] = max(timer[2], seconds)
+
+    def event(self, name, **fields):
+        self.events[name] = self.events.get(name, 0) + 1
+
+    def summary(self):
+        """
+        Returns everything collected as a dictionary that can be saved as JSON.
+        """
+        return {
+            "counters": dict(self.counters),
+            "timers": {name: {"count": n, "total": total, "max": longest}
+                       for (name, (n, total, longest)) in self.timers.items()},
+            "events": dict(self.events),
+        }
+
+
+class JSONLWriter(Metrics):
+    """
+    Writes every counter, timer and event as one line of JSON to a file,
+    given as an open file or a path to append to.
+    """
+
+    def __init__(self, out):
+        self.owned = isinstance(out, str)
+        self.out = open(out, "a") if self.owned else out
+
+    def write(self, record):
+        record["t"] = time.time()
+        self.out.write(json.dumps(record) + "\n")
+
+    def count(self, name, n=1):
+        self.write({"type": "count", "name": name, "value": n})
+
+    def time(self, name, seconds):
+        self.write({"type": "time", "name": name, "value": seconds})
+
+    def event(self, name, **fields):
+        self.write({"type": "event", "name": name, "fields": fields})
+
+    def close(self):
+        self.out.flush()
+        if self.owned:
+            self.out.close()
+
+
+class Console(Metrics):
+    """
+    Prints timers and events as they come, for a game played by hand.
+    """
+
+    def __init__(self, out=None):
+        self.out = out or sys.stdout
+
+    def time(self, name, seconds):
+        print(f"{name}: {seconds} seconds", file=self.out)
+
+    def event(self, name, **fields):
+        print(name + ": " + ", ".join(f"{key} {value}" for (key, value) in fields.items()), file=self.out)
@@ -0,0 +1,141 @@
+# Here we implement a cache of the legal placements of a player.
+#
+# The placements are grouped by the corner (anchor) of the player that
+# they cover. A single placement only changes a handful of cells, so
+# once the board moves on the cache does not regenerate every placement:
+# entries whose cells overlap the new pieces, or share an edge with the
+# player's own new pieces, are pruned, entries are generated for the
+# corners the player has gained, and pieces the player has played are
+# dropped.
+#
+# The cache only follows the real placements on a board. While moves are
+# being probed through Board.apply, the placements of the probed position
+# are derived from the entries in the same way, without changing them, so
+# that a search does not pay for regenerating every placement at each node.
+# If the entries cannot be brought up to date (e.g. another board, or the
+# first round has ended), the player generates its placements from scratch.
+
+class MoveCache:
+    """
+    Keeps the legal placements of one player, keyed by corner,
+    in step with the placements made on a board.
+    """
+
+    def __init__(self):
+        # corner -> list of (mask, placement) covering that corner
+        self.entries = {}
+        self.board = None
+        # number of placements in the board's history the entries reflect
+        self.synced = 0
+        # whether the entries were made under the first-round rules
+        self.opening = None
+
+    def moves(self, player, pieces, game):
+        """
+        Returns an iterator over the unique placements of the given pieces
+        (Shape objects) for the player, or None if the cache cannot answer
+        for the current state of the game.
+        """
+        ids = set([sh.ID for sh in pieces])
+        if not ids <= set([sh.ID for sh in player.pieces]):
+            return None
+        if self.sync(player, game):
+            return self.placements(self.entries, ids)
+        if self.derivable(game):
+            return self.placements(self.updated(player, game, pieces), ids)
+        return None
+
+    def placements(self, entries, ids):
+        """
+        Yields the unique placements in the entries of the pieces with the given IDs.
+        """
+        visited = set()
+        for entry in entries.values():
+            for (mask, placement) in entry:
+                if placement.ID in ids and mask not in visited:
+                    visited.add(mask)
+                    yield placement
+
+    def any_moves(self, player, game):
+        """
+        Returns whether the player has any placement left, or None if
+        the cache cannot answer for the current state of the game.
+        """
+        if self.sync(player, game):
+            entries = self.entries
+        elif self.derivable(game):
+            entries = self.updated(player, game, player.pieces)
+        else:
+            return None
+        return True in [len(entry) > 0 for entry in entries.values()]
+
+    def derivable(self, game):
+        """
+        Returns whether the placements of a probed position can be derived
+        from the entries: the probes must only have added placements to
+        the board history the entries were synced with.
+        """
+        board = game.board
+        opening = game.rounds < len(game.players)
+        return (board is self.board and opening == self.opening
+                and self.synced <= len(board.history) - len(board.journal))
+
+    def sync(self, player, game):
+        """
+        Brings the entries up to date with the board, rebuilding them if
+        they cannot be updated, and returns whether that was possible.
+        """
+        board = game.board
+        if board.journal:
+            return False
+
+        opening = game.rounds < len(game.players)
+        if board is not self.board or opening != self.opening or self.synced > len(board.history):
+            self.rebuild(player, game)
+        elif self.synced < len(board.history):
+            self.advance(player, game)
+        return True
+
+    def rebuild(self, player, game):
+        """
+        Generates the placements at every corner of the player from scratch.
+        """
+        self.entries = {}
+        for cr in player.free_corners(game.board):
+            self.entries[cr] = list(player.corner_moves(cr, player.pieces, game))
+        self.board = game.board
+        self.synced = len(game.board.history)
+        self.opening = game.rounds < len(game.players)
+
+    def advance(self, player, game):
+        """
+        Brings the entries up to date with the placements made on the
+        board since they were last synced.
+        """
+        self.entries = self.updated(player, game, player.pieces)
+        self.synced = len(game.board.history)
+
+    def updated(self, player, game, pieces):
+        """
+        Returns the entries brought up to date with the placements made
+        on the board since they were last synced, generating placements
+        of the given pieces (Shape objects) at any new corners. The
+        entries themselves are left unchanged.
+        """
+        board = game.board
+        # cells that a still legal placement can no longer cover
+        touched = 0
+        for (label, mask) in board.history[self.synced:]:
+            touched |= mask
+            if label == player.label:
+                touched |= board.edges(mask)
+
+        ids = set([sh.ID for sh in player.pieces])
+        entries = {}
+        for cr in player.free_corners(board):
+            if cr in self.entries:
+                entries[cr] = [(mask, placement) for (mask, placement) in self.entries[cr]
+                               if not (mask & touched) and placement.ID in ids]
+            else:
+                entries[cr] = list(player.corner_moves(cr, pieces, game))
+        return entries
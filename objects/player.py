@@ -1,5 +1,6 @@
-import copy
 import numpy as np
+from .moves import MoveCache
+from .shape_map import get_orientations
 
 
 # Players play according to a certain strategy,  as
@@ -15,18 +16,34 @@ class Player:
         self.strategy = strategy
         self.score = 0
         self.weights = weights
+        # states of the player before each placement made through apply
+        self.journal = []
+        # legal placements kept in step with the board
+        self.moves = MoveCache()
+        # set once the player has no valid placement left
+        self.finished = False
+        # scores the player's placements (see Evaluator), None for eval_move's heuristic
+        self.evaluator = None
+        # opening book consulted before the strategy (see book.py), if any
+        self.book = None
+        # placements left when an endgame solve last ran out of time (see endgame.py)
+        self.unsolved = None
 
     def add_pieces(self, pieces):
         """
         Gives a player the initial set of pieces.
         """
         self.pieces = pieces
+        self.moves = MoveCache()
+        self.finished = False
 
     def start_corner(self, p):
         """
         Gives a player an initial starting corner.
         """
         self.corners = set([p])
+        self.moves = MoveCache()
+        self.finished = False
 
     def remove_piece(self, piece):
         """
@@ -39,58 +56,112 @@ class Player:
         """
         Updates the variables that the player is keeping track
         of, e.g. their score and their available corners.
-        Placement should be in the form of a Shape object.
+        Placement should be in the form of a Shape object, and
+        the board should already have been updated with it.
         """
         self.score = self.score + placement.size
+        # drop the corners that have been covered since the last update
+        self.corners = set([(i, j) for (i, j) in self.corners if board.state[j][i] == board.null])
         for c in placement.corners:
             if board.in_bounds(c) and (not board.overlap([c])):
                 self.corners.add(c)
 
-    def possible_moves(self, pieces, game):
+    def apply(self, placement, board):
         """
-        Returns a unique list of placements, i.e. Shape objects
-        with a particular flip, orientation, corners, and points.
-        It uses a list of pieces (Shape objects) and the game, which includes
-        its rules and valid moves, in order to find the placements.
+        Plays a placement (Shape object) for the player in place,
+        recording its score, pieces and corners so that undo can
+        take it back. The board should already have been updated.
         """
+        self.journal.append((self.score, self.pieces, self.corners))
+        self.update_player(placement, board)
+        self.remove_piece(placement)
 
-        def check_corners(game):
-            """
-            Updates the corners of the player, in case the
-            corners have been covered by another player's pieces.
-            """
-            self.corners = set([(i, j) for (i, j) in self.corners if game.board.state[j][i] == game.board.null])
+    def undo(self):
+        """
+        Takes back the most recent placement made through apply.
+        """
+        self.score, self.pieces, self.corners = self.journal.pop()
 
-        # Check the corners before proceeding.
-        check_corners(game)
+    def free_corners(self, board):
+        """
+        Returns the corners of the player that have not been
+        covered by any pieces on the board. The player's own
+        corners are left alone, since the board may only be
+        probing a move that will be undone.
+        """
+        return [(i, j) for (i, j) in self.corners if board.state[j][i] == board.null]
+
+    def has_legal_move(self, game):
+        """
+        Returns whether the player has at least one valid placement,
+        stopping at the first one found. Once a player has none left
+        in a real (not probed) position it is marked as finished and
+        never checked again, since placements never free up cells.
+        """
+        if self.finished:
+            return False
 
-        # This list of placements will be updated with valid ones.
-        placements = []
-        visited = []
+        found = self.moves.any_moves(self, game)
+        if found is None:
+            found = next(self.iter_moves(self.pieces, game), None) is not None
 
+        if not found and not game.board.journal:
+            self.finished = True
+        return found
+
+    def corner_moves(self, cr, pieces, game):
+        """
+        Yields the valid placements of the pieces (Shape objects) that
+        cover the corner cr, as (mask, placement) pairs where the mask
+        is the placement's bitmask on the board. Distinct orientations
+        can never cover the same cells at the same corner, so every
+        pair is unique.
+        """
+        board = game.board
+        # Look through every piece offered. (This will be restricted according
+        # to certain algorithms.)
+        for sh in pieces:
+            # Loop over every unique orientation of the piece, precomputed
+            # in the shape map, so no flipping or rotating is needed.
+            for orientation in get_orientations(sh):
+                # And every point of the orientation that could lie on the corner.
+                for num in range(orientation.size):
+                    mask = board.placement_mask(orientation, cr, num)
+                    if mask is not None and game.valid_mask(self, mask):
+                        yield mask, sh.place(orientation, cr, num)
+
+    def iter_moves(self, pieces, game):
+        """
+        Yields the unique placements of the pieces (Shape objects) one at
+        a time, as they are found, so that callers can stop early. Two
+        placements are the same if they have the same bitmask.
+        """
+        # Use the cached placements when they can be kept up to date.
+        cached = self.moves.moves(self, pieces, game)
+        if cached is not None:
+            game.metrics.count("moves.cache_hits")
+            for placement in cached:
+                yield placement
+            return
+
+        game.metrics.count("moves.cache_misses")
+        visited = set()
         # Loop through every available corner.
-        for cr in self.corners:
-            # Look through every piece offered. (This will be restricted according
-            # to certain algorithms.)
-            for sh in pieces:
-                # Create a new shape so that the one in the player's
-                # list of shapes is not overwritten.
-                try_out = copy.deepcopy(sh)
-                # Loop over every potential refpt the piece could have.
-                for num in range(try_out.size):
-                    try_out.create(num, cr)
-                    # And every possible flip.
-                    for fl in ["h", "None"]:
-                        try_out.flip(fl)
-                        # And every possible orientation.
-                        for rot in [90] * 4:
-                            try_out.rotate(rot)
-                            candidate = copy.deepcopy(try_out)
-                            if game.valid_move(self, candidate.points):
-                                if not (set(candidate.points) in visited):
-                                    placements.append(candidate)
-                                    visited.append(set(candidate.points))
+        for cr in self.free_corners(game.board):
+            for (mask, placement) in self.corner_moves(cr, pieces, game):
+                if mask not in visited:
+                    visited.add(mask)
+                    yield placement
 
+    def possible_moves(self, pieces, game):
+        """
+        Returns a unique list of placements, i.e. Shape objects
+        with a particular flip, orientation, corners, and points.
+        It uses a list of pieces (Shape objects) and the game, which includes
+        its rules and valid moves, in order to find the placements.
+        """
+        placements = list(self.iter_moves(pieces, game))
+        game.metrics.count("moves.generated", len(placements))
         return placements
 
     def do_move(self, game, weights):
@@ -101,41 +172,145 @@ class Player:
         return self.strategy(self, game, weights)
 
 
-def eval_move(piece, player, game, weights):
+def eval_move(piece, player, game, weights, table=None):
     """
     Takes in a single Piece object and a Player object and returns a integer score that
     evaluates how "good" the Piece move is. Defined here because used by both Greedy and Minimax.
+    The move is probed on the game's board in place and taken back before returning.
+    If a TranspositionTable is given, scores are memoized in it by the key of the position
+    the move leads to, so the table should only be shared by evaluations with the same weights.
     """
 
-    def check_corners(player):
-        """
-        Updates the corners of the player in the test board (copy), in case the
-        corners have been covered by another player's pieces.
-        """
-        player.corners = set([(i, j) for (i, j) in player.corners if test_board.state[j][i] == game.board.null])
-
     # get board
     board = game.board
-    # create a copy of the players in the game
-    test_players = copy.deepcopy(game.players)
+    # look the score up by the key of the position after the Piece placement
+    if table is not None:
+        key = board.state_key(player.label) ^ board.placement_key(player.label, piece.points, piece.ID)
+        entry = table.probe(key)
+        if entry is not None:
+            game.metrics.count("eval.table_hits")
+            return piece, entry[2]
+    game.metrics.count("eval.calls")
     # create a list of the opponents in the game
-    opponents = [opponent for opponent in test_players if opponent.label != player.label]
-    # create a copy of the board
-    test_board = copy.deepcopy(board)
-    # update the copy of the board with the Piece placement
-    test_board.update(player, piece.points)
-    # create a copy of the player currently playing
-    test_player = copy.deepcopy(player)
-    # update the current player (update corners) with the current Piece placement
-    test_player.update_player(piece, test_board)
-    # calculate how many corners the current player has
-    my_corners = len(test_player.corners)
-    # update the corners for all opponents
-    list(map(check_corners, opponents))
-    # calculate the mean of the corners of the opponents
-    opponent_corners = [len(opponent.corners) for opponent in opponents]
+    opponents = [opponent for opponent in game.players if opponent.label != player.label]
+    # find the corners the current player has before the Piece placement
+    my_corners = set(player.free_corners(board))
+    # update the board with the Piece placement
+    board.apply(player, piece)
+    # add the corners created by the current Piece placement
+    for c in piece.corners:
+        if board.in_bounds(c) and (not board.overlap([c])):
+            my_corners.add(c)
+    # calculate how many corners each opponent has left after the Piece placement
+    opponent_corners = [len(opponent.free_corners(board)) for opponent in opponents]
+    # take the Piece placement back
+    board.undo()
     # find the difference between the number of corners the current player has and and the
     # mean number of corners the opponents have
-    corner_difference = np.mean([my_corners - opponent_corner for opponent_corner in opponent_corners])
-    # return the score = size + difference in the number of corners
-    return piece, weights[0] * piece.size + weights[1] * corner_difference
+    corner_difference = np.mean([len(my_corners) - opponent_corner for opponent_corner in opponent_corners])
+    # the score = size + difference in the number of corners
+    score = weights[0] * piece.size + weights[1] * corner_difference
+    if table is not None:
+        table.store(key, 0, score)
+    return piece, score
+
+
+class Evaluator:
+    """
+    Scores candidate placements for eval_moves. An evaluator is given the cells and
+    corners of every candidate, as laid out by eval_moves, and returns the array of
+    their scores, higher being better. This one scores them as eval_move does;
+    learned evaluators (see evaluator.py) override score_cells.
+    """
+
+    def score_cells(self, cells, corners, player, game, weights):
+        return score_cells(cells, corners, player, game, weights)
+
+    def start(self, game):
+        """
+        Called once the game the evaluator's player is in has begun.
+        """
+
+
+HEURISTIC = Evaluator()
+
+
+def eval_moves(pieces, player, game, weights, evaluator=None):
+    """
+    Takes in a list of Piece objects that are all placements for the same Player object
+    and returns a list of (piece, score) tuples, with the same scores as eval_move,
+    computed for all of the pieces at once, or the scores of the given Evaluator.
+    """
+    game.metrics.count("eval.calls", len(pieces))
+    cells = layout([piece.points for piece in pieces], game.board.size)
+    corners = layout([piece.corners for piece in pieces], game.board.size)
+
+    scores = (evaluator or HEURISTIC).score_cells(cells, corners, player, game, weights)
+    return list(zip(pieces, scores))
+
+
+def layout(lists, size):
+    """
+    Returns an array with one row of cell indices (y * columns + x) per list of
+    points, for a board of the given size. Every point outside the board, and the
+    padding of shorter lists, is the sentinel n * m, one past the last cell.
+    """
+    (n, m) = size
+    sentinel = n * m
+    lengths = np.array([len(points) for points in lists], dtype=np.int64)
+    flat = np.array([p for points in lists for p in points], dtype=np.int64).reshape(-1, 2)
+    inside = (flat[:, 0] >= 0) & (flat[:, 0] < m) & (flat[:, 1] >= 0) & (flat[:, 1] < n)
+    table = np.full((len(lists), max(lengths.max(initial=0), 1)), sentinel, dtype=np.int64)
+    rows = np.repeat(np.arange(len(lists)), lengths)
+    cols = np.arange(len(flat)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    table[rows, cols] = np.where(inside, flat[:, 1] * m + flat[:, 0], sentinel)
+    return table
+
+
+def score_cells(cells, corners, player, game, weights):
+    """
+    Takes in an array of the cell indices (y * columns + x) covered by each candidate
+    placement of a Player object, one row per candidate, and an array of the indices of
+    their corners, both padded with the index one past the last cell of the board.
+    Returns the array of scores weights[0] * size + weights[1] * corner difference
+    of every candidate, computed in one vectorized pass over the candidates.
+    """
+    board = game.board
+    (n, m) = board.size
+    sentinel = n * m
+    opponents = [opponent for opponent in game.players if opponent.label != player.label]
+
+    def lookup(points):
+        """
+        Returns a boolean array over the cells (and the sentinel) that is True
+        at each of the given points.
+        """
+        table = np.zeros(sentinel + 1, dtype=bool)
+        table[[j * m + i for (i, j) in points]] = True
+        return table
+
+    # cells that are empty before the placement
+    empty = np.zeros(sentinel + 1, dtype=bool)
+    empty[:sentinel] = np.array(board.state).ravel() == board.null
+    # corners of the current player before the placement
+    free = player.free_corners(board)
+    mine = lookup(free)
+    # number of opponents that have each cell as a corner before the placement
+    covered = np.zeros(sentinel + 1, dtype=np.int64)
+    opponent_total = 0
+    for opponent in opponents:
+        theirs = opponent.free_corners(board)
+        covered += lookup(theirs)
+        opponent_total += len(theirs)
+
+    sizes = (cells != sentinel).sum(axis=1)
+    # corners created by the placement: on the board, empty, not already a corner
+    # of the player and not covered by the placement itself
+    inside = (corners[:, :, None] == cells[:, None, :]).any(axis=2)
+    created = empty[corners] & ~mine[corners] & ~inside
+    my_corners = len(free) + created.sum(axis=1)
+    # corners of the opponents left after the placement, summed over the opponents
+    opponent_corners = opponent_total - covered[cells].sum(axis=1)
+    # the mean over the opponents of my corners minus theirs
+    corner_difference = (len(opponents) * my_corners - opponent_corners) / len(opponents)
+    return weights[0] * sizes + weights[1] * corner_difference
@@ -0,0 +1,235 @@
+import json
+import mmap
+import os
+import struct
+from .board import Board
+from .shape_map import ORIENTATIONS
+from .state import SHAPE_IDS
+
+# Here we implement a compact binary record of a game, made to store games by
+# the million. Every placement is one 3 byte integer:
+#
+#     player (2 bits) | orientation (7 bits) | anchor cell (15 bits)
+#
+# where player is the position of the player's label in LABELS, orientation is
+# the global index of the placement's Orientation in ORIENTATIONS, and the
+# anchor cell is y * m + x of the top left corner (x, y) of the placement's
+# bounding box on a board of m columns. The orientation and anchor are found
+# from the placement's bitmask alone, so a record can be made from the
+# (label, mask) history that every board keeps.
+#
+# A record starts with a header of JSON (the board size, players, strategies,
+# weights, seed and whatever else the caller adds), then the placements:
+#
+#     b"BLKG" | version (1 byte) | header length (4 bytes) | header
+#     | number of placements (4 bytes) | placements (3 bytes each)
+#
+# Many records are kept in one container file, followed by an index of the
+# offset of every record so that any game can be read without the others:
+#
+#     b"BLKS" | version (1 byte) | records | offsets (8 bytes each)
+#     | number of records (8 bytes) | offset of the index (8 bytes)
+#
+# All integers are little-endian.
+
+LABELS = "ABCD"
+VERSION = 1
+RECORD_MAGIC = b"BLKG"
+FILE_MAGIC = b"BLKS"
+HEADER = struct.Struct("<4sBI")
+FOOTER = struct.Struct("<QQ")
+
+
+def normalize(points):
+    """
+    Returns the top left corner (x, y) of the bounding box of a list of
+    points, and the points as offsets from it.
+    """
+    x = min(i for (i, j) in points)
+    y = min(j for (i, j) in points)
+    return (x, y), frozenset((i - x, j - y) for (i, j) in points)
+
+
+# offsets of every orientation from the top left corner of its bounding box
+OFFSETS = [sorted(normalize(orientation.points)[1]) for orientation in ORIENTATIONS]
+# offsets from the top left corner of the bounding box -> orientation index
+BY_OFFSETS = dict([(frozenset(offsets), index) for (index, offsets) in enumerate(OFFSETS)])
+
+
+def encode(label, points, size):
+    """
+    Returns the integer of a placement by the player with the given
+    label, covering points, on a board of the given size.
+    """
+    ((x, y), offsets) = normalize(points)
+    return (LABELS.index(label) << 22) | (BY_OFFSETS[offsets] << 15) | (y * size[1] + x)
+
+
+def decode(code, size):
+    """
+    Returns (label, orientation index, points) of the integer of a placement.
+    """
+    (y, x) = divmod(code & 0x7FFF, size[1])
+    index = (code >> 15) & 0x7F
+    return LABELS[code >> 22], index, [(x + i, y + j) for (i, j) in OFFSETS[index]]
+
+
+class GameRecord:
+    """
+    A game as its header (a dictionary, which must contain the board size)
+    and the list of the integers of its placements, in the order they were made.
+    """
+
+    def __init__(self, header, codes):
+        self.header = header
+        self.codes = codes
+        self.size = tuple(header["size"])
+
+    @classmethod
+    def from_history(cls, history, size, **header):
+        """
+        Returns the record of a board's (label, mask) history.
+        """
+        board = Board(size[0], size[1], "_")
+        codes = [encode(label, board.points(mask), size) for (label, mask) in history]
+        header["size"] = list(size)
+        return cls(header, codes)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def to_bytes(self):
+        header = json.dumps(self.header, separators=(",", ":")).encode()
+        return b"".join([HEADER.pack(RECORD_MAGIC, VERSION, len(header)), header,
+                         struct.pack("<I", len(self.codes))]
+                        + [code.to_bytes(3, "little") for code in self.codes])
+
+    @classmethod
+    def from_bytes(cls, data, offset=0):
+        """
+        Returns the record starting at offset in data, and the offset
+        just after it.
+        """
+        (magic, version, length) = HEADER.unpack_from(data, offset)
+        if magic != RECORD_MAGIC or version != VERSION:
+            raise ValueError("not a game record of version " + str(VERSION))
+        offset += HEADER.size
+        header = json.loads(bytes(data[offset:offset + length]))
+        offset += length
+        (count,) = struct.unpack_from("<I", data, offset)
+        offset += 4
+        codes = [int.from_bytes(data[i:i + 3], "little") for i in range(offset, offset + 3 * count, 3)]
+        return cls(header, codes), offset + 3 * count
+
+    def placements(self, upto=None):
+        """
+        Yields (label, piece ID, orientation index, points) of the first upto
+        placements (all of them by default).
+        """
+        for code in self.codes[:upto]:
+            (label, index, points) = decode(code, self.size)
+            yield label, ORIENTATIONS[index].ID, index, points
+
+    def history(self, upto=None):
+        """
+        Returns the (label, mask) history of the first upto placements.
+        """
+        board = Board(self.size[0], self.size[1], "_")
+        return [(label, board.mask(points)) for (label, ID, index, points) in self.placements(upto)]
+
+    def board(self, upto=None, null="_"):
+        """
+        Returns the Board after the first upto placements (all of them by
+        default), with the same grid, bitmasks, history and Zobrist key
+        as the board the game was played on.
+        """
+        board = Board(self.size[0], self.size[1], null)
+        history = []
+        key = 0
+        for (label, ID, index, points) in self.placements(upto):
+            history.append((label, board.mask(points)))
+            key ^= board.placement_key(label, points, ID)
+        board.load(history, key)
+        return board
+
+    def pieces(self, label, upto=None):
+        """
+        Returns the Shapes the player with the given label had not
+        placed yet after the first upto placements.
+        """
+        placed = set(ID for (other, ID, index, points) in self.placements(upto) if other == label)
+        return [shape() for (ID, shape) in SHAPE_IDS.items() if ID not in placed]
+
+
+class RecordWriter:
+    """
+    Writes game records to a container file. Records are appended to an
+    existing file, whose index is read and rewritten after the new records.
+    """
+
+    def __init__(self, path):
+        self.offsets = []
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            reader = RecordReader(path)
+            self.offsets = list(reader.offsets)
+            end = reader.index
+            reader.close()
+            self.file = open(path, "r+b")
+            self.file.truncate(end)
+            self.file.seek(end)
+        else:
+            self.file = open(path, "wb")
+            self.file.write(FILE_MAGIC + bytes([VERSION]))
+
+    def write(self, record):
+        self.offsets.append(self.file.tell())
+        self.file.write(record.to_bytes())
+
+    def close(self):
+        index = self.file.tell()
+        self.file.write(struct.pack("<%dQ" % len(self.offsets), *self.offsets))
+        self.file.write(FOOTER.pack(len(self.offsets), index))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class RecordReader:
+    """
+    Reads the game records of a container file by their number, through
+    a memory map of the file.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[:4] != FILE_MAGIC or self.data[4] != VERSION:
+            raise ValueError(path + " is not a file of game records of version " + str(VERSION))
+        (count, self.index) = FOOTER.unpack_from(self.data, len(self.data) - FOOTER.size)
+        self.offsets = struct.unpack_from("<%dQ" % count, self.data, self.index)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, i):
+        return GameRecord.from_bytes(self.data, self.offsets[i])[0]
+
+    def __iter__(self):
+        for offset in self.offsets:
+            yield GameRecord.from_bytes(self.data, offset)[0]
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
@@ -0,0 +1,154 @@
+import os
+import numpy as np
+
+
+# The renderer draws a board as a single pcolormesh of one integer per cell:
+# 0 for an empty cell and 1 to 4 for the players A to D, coloured as
+# fancy_board colours them. It draws on a Figure of its own with the Agg
+# canvas rather than through pyplot, so it needs no display, never opens a
+# window and is not slowed down by a GUI backend. The figure and its mesh
+# are made once, and every new frame only replaces the data of the mesh,
+# which takes a few milliseconds (imshow takes several times longer, as it
+# resamples the image to the size of the figure on every draw).
+#
+# A whole game is rendered from its move log, a list of (label, mask)
+# placements as kept in board.history:
+#
+#     Renderer(board.size).animate(board.history, "game.gif")
+#
+# GIFs are written with Pillow, MP4s with ffmpeg, which must be installed.
+
+LABELS = "ABCD"
+COLORS = ["lightgrey", "red", "blue", "green", "yellow"]
+
+
+def mask_array(mask, size):
+    """
+    Returns an n by m array of booleans, true where the bitmask of a
+    board of the given size covers a cell.
+    """
+    (n, m) = size
+    stride = m + 1
+    bits = np.frombuffer(mask.to_bytes((n * stride + 7) // 8, "little"), dtype=np.uint8)
+    return np.unpackbits(bits, bitorder="little")[:n * stride].reshape(n, stride)[:, :m].astype(bool)
+
+
+def array_mask(array):
+    """
+    Returns the bitmask of the cells of an n by m array that are true,
+    the inverse of mask_array.
+    """
+    padded = np.pad(np.asarray(array, dtype=bool), ((0, 0), (0, 1)))
+    return int.from_bytes(np.packbits(padded, bitorder="little").tobytes(), "little")
+
+
+def board_array(board):
+    """
+    Returns the integer array of the cells of a board.
+    """
+    cells = np.zeros(board.size, dtype=np.uint8)
+    for (label, mask) in board.occupied.items():
+        cells[mask_array(mask, board.size)] = LABELS.index(label) + 1
+    return cells
+
+
+def history_arrays(history, size):
+    """
+    Yields the integer array of the board after every placement of
+    a history of (label, mask) placements, starting with the empty board.
+    """
+    cells = np.zeros(size, dtype=np.uint8)
+    yield cells.copy()
+    for (label, mask) in history:
+        cells[mask_array(mask, size)] = LABELS.index(label) + 1
+        yield cells.copy()
+
+
+def draw(ax, cells):
+    """
+    Draws the integer array of a board on a matplotlib Axes, the first
+    row at the top, and returns the mesh, which can be given new cells
+    with set_array(cells.ravel()).
+    """
+    from matplotlib.colors import ListedColormap
+
+    (n, m) = cells.shape
+    mesh = ax.pcolormesh(cells, cmap=ListedColormap(COLORS), vmin=0, vmax=len(COLORS) - 1,
+                         edgecolors="white", linewidth=0.5)
+    ax.set_xlim(0, m)
+    ax.set_ylim(n, 0)
+    ax.set_aspect("equal")
+    ax.set_axis_off()
+    return mesh
+
+
+class Renderer:
+    """
+    Draws boards of a given size (n, m) off screen, reusing one figure.
+    """
+
+    def __init__(self, size, inches=6, dpi=100):
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+        self.size = size
+        self.figure = Figure(figsize=(inches, inches), dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.ax = self.figure.add_axes((0.02, 0.02, 0.96, 0.93))
+        self.mesh = draw(self.ax, np.zeros(size, dtype=np.uint8))
+        # made on the first title, as text is slow to draw
+        self.title = None
+
+    def draw(self, cells, title=None):
+        """
+        Shows the given integer array of a board, or a Board, with
+        a line of text above it if a title is given.
+        """
+        if not isinstance(cells, np.ndarray):
+            cells = board_array(cells)
+        self.mesh.set_array(cells.ravel())
+        if title is not None and self.title is None:
+            self.title = self.figure.text(0.5, 0.97, title, ha="center", fontsize=8)
+        elif self.title is not None:
+            self.title.set_text(title or "")
+        return self
+
+    def save(self, path):
+        """
+        Writes the board last drawn to an image file, such as a PNG.
+        """
+        self.figure.savefig(path)
+
+    def rgba(self):
+        """
+        Returns the board last drawn as an array of RGBA pixels.
+        """
+        self.canvas.draw()
+        return np.asarray(self.canvas.buffer_rgba()).copy()
+
+    def animate(self, history, path, fps=4):
+        """
+        Writes an animation of a game, one frame per placement of its
+        history of (label, mask) placements, to a GIF or MP4 file.
+        """
+        from matplotlib import animation
+
+        if path.lower().endswith(".gif"):
+            writer = animation.PillowWriter(fps=fps)
+        else:
+            writer = animation.FFMpegWriter(fps=fps)
+        with writer.saving(self.figure, path, self.figure.dpi):
+            for (i, cells) in enumerate(history_arrays(history, self.size)):
+                self.draw(cells, f"placement {i}")
+                writer.grab_frame()
+
+    def frames(self, history, directory, prefix="frame"):
+        """
+        Writes every placement of a history as a numbered PNG in a directory
+        and returns their paths.
+        """
+        paths = []
+        for (i, cells) in enumerate(history_arrays(history, self.size)):
+            paths.append(os.path.join(directory, f"{prefix}{i:03d}.png"))
+            self.draw(cells, f"placement {i}").save(paths[-1])
+        return paths
@@ -75,6 +75,79 @@ class Shape(object):
         else:
             raise Exception("Invalid orientation.")
 
+    def place(self, orientation, pt, num):
+        """
+        Returns a new Shape of the same kind covering the given
+        Orientation, translated so that its point num lies on pt.
+        Unlike create, flip and rotate, no trigonometry is involved.
+        """
+        placement = self.__class__()
+        placement.ID = self.ID
+        placement.size = self.size
+        placement.points_map = orientation.points
+        placement.refpt = pt
+        placement.points = orientation.cells(pt, num)
+        placement.corners = orientation.cells(pt, num, orientation.corners)
+        return placement
+
+
+class Orientation(object):
+    """
+    One fixed orientation (flip and rotation) of a shape, stored as
+    integer offsets of its points and corners from its generation point.
+    The index is the orientation's position in the global table.
+    """
+
+    def __init__(self, ID, index, points, corners):
+        self.ID = ID
+        self.index = index
+        self.points = points
+        self.corners = corners
+        self.size = len(points)
+
+    def cells(self, pt, num, offsets=None):
+        """
+        Returns the offsets (the points by default) translated so
+        that point num of the orientation lies on pt.
+        """
+        x = pt[0] - self.points[num][0]
+        y = pt[1] - self.points[num][1]
+        if offsets is None:
+            offsets = self.points
+        return [(x + i, y + j) for (i, j) in offsets]
+
+
+def orientations(shape):
+    """
+    Returns every unique fixed orientation of a shape as a list of
+    (points, corners) pairs of integer offsets from its generation point.
+    The shape's points and corners are overwritten in the process.
+    """
+    shape.set_points(0, 0)
+    unique = []
+    visited = set()
+
+    for fl in [False, True]:
+        points = shape.points
+        corners = shape.corners
+        if fl:
+            points = [(-x, y) for (x, y) in points]
+            corners = [(-x, y) for (x, y) in corners]
+        for rot in range(4):
+            # two orientations are the same if they cover the same
+            # cells once moved to the origin
+            min_x = min(x for (x, y) in points)
+            min_y = min(y for (x, y) in points)
+            key = frozenset((x - min_x, y - min_y) for (x, y) in points)
+            if key not in visited:
+                visited.add(key)
+                unique.append((points, corners))
+            # rotate 90 degrees clockwise about the generation point
+            points = [(y, -x) for (x, y) in points]
+            corners = [(y, -x) for (x, y) in corners]
+
+    return unique
+
 
 def rotate_x(xxx_todo_changeme, xxx_todo_changeme1, deg):
     """
@@ -1,4 +1,4 @@
-from .shape import Shape
+from .shape import Shape, Orientation, orientations
 
 
 # The highlighted point is the generation point and the
@@ -218,3 +218,32 @@ class Y(Shape):
     def set_points(self, x, y):
         self.points = [(x, y), (x, y + 1), (x + 1, y), (x + 2, y), (x - 1, y)]
         self.corners = [(x + 3, y - 1), (x + 3, y + 1), (x + 1, y + 2), (x - 1, y + 2), (x - 2, y + 1), (x - 2, y - 1)]
+
+
+# All 21 shapes, in the order they are handed out to the players.
+SHAPES = [I1, I2, I3, I4, I5, V3, L4, Z4, O4, L5, T5, V5, N, Z5, T4, P, W, U, F, X, Y]
+
+# Every unique fixed orientation of every shape (91 for the standard set),
+# built once at import. ORIENTATIONS is indexed by the orientation's global
+# index; SHAPE_ORIENTATIONS maps a shape ID to its own orientations.
+ORIENTATIONS = []
+SHAPE_ORIENTATIONS = {}
+
+
+def get_orientations(shape):
+    """
+    Returns the list of Orientation objects of a shape, adding
+    them to the table the first time an unknown shape is seen.
+    """
+    if shape.ID not in SHAPE_ORIENTATIONS:
+        table = []
+        for (points, corners) in orientations(shape.__class__()):
+            orientation = Orientation(shape.ID, len(ORIENTATIONS), points, corners)
+            ORIENTATIONS.append(orientation)
+            table.append(orientation)
+        SHAPE_ORIENTATIONS[shape.ID] = table
+    return SHAPE_ORIENTATIONS[shape.ID]
+
+
+for sh in SHAPES:
+    get_orientations(sh())
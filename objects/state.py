@@ -0,0 +1,55 @@
+from .board import Board
+from .shape_map import SHAPES
+
+# Here we implement a compact form of the state of a game that can be
+# pickled cheaply and sent to other processes. Instead of the Game object
+# itself, with every Shape object, journal and cache of its players, it
+# keeps the placements made on the board as bitmasks and each player's
+# pieces as IDs, which is all that is needed to rebuild the game.
+
+SHAPE_IDS = dict([(sh().ID, sh) for sh in SHAPES])
+
+
+def pack(game):
+    """
+    Returns a tuple of the state of the game made of plain
+    values (and the game, player and strategy classes).
+    """
+    board = game.board
+    players = [(p.__class__, p.label, p.name, p.strategy, p.weights, p.score,
+                [s.ID for s in p.pieces], sorted(p.corners), p.finished) for p in game.players]
+    return (game.__class__, board.size, board.null, list(board.history), board.key,
+            game.rounds, [s.ID for s in game.all_pieces], players)
+
+
+def unpack(state):
+    """
+    Returns a new game rebuilt from a tuple made by pack.
+    """
+    (cls, (n, m), null, history, key, rounds, all_pieces, packed) = state
+    board = Board(n, m, null)
+    board.load(history, key)
+
+    players = []
+    for (player_cls, label, name, strategy, weights, score, pieces, corners, finished) in packed:
+        player = player_cls(label, name, strategy, weights)
+        player.pieces = [SHAPE_IDS[ID]() for ID in pieces]
+        player.corners = set(corners)
+        player.score = score
+        player.finished = finished
+        players.append(player)
+
+    game = cls(players, board, [SHAPE_IDS[ID]() for ID in all_pieces])
+    game.rounds = rounds
+    return game
+
+
+def warm(game):
+    """
+    Brings the move cache of every player of a game up to date with its
+    board, so that the placements of the positions probed from it are
+    derived from the cache rather than generated from scratch.
+    """
+    for player in game.players:
+        if not player.finished:
+            player.moves.sync(player, game)
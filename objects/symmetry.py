@@ -0,0 +1,150 @@
+import numpy as np
+from .render import array_mask, mask_array
+from .zobrist import key
+
+# Here we implement the symmetries of Blokus positions. A square board can be
+# turned and mirrored in 8 ways (4 when it is not square, which cannot be
+# turned by a quarter), and a position turned or mirrored is played the same
+# way, provided the players move in the same order and start in the corners
+# their pieces were turned to. So positions are kept by seat rather than by
+# colour: the player to move is seat 0 and the others follow in their order
+# of play, which maps every relabelling of the colours that keeps the order
+# of play onto the same seats.
+#
+# A transform is a (swap, flip_x, flip_y) tuple: the point (x, y) is mirrored
+# to (m - 1 - x, y) if flip_x and to (x, n - 1 - y) if flip_y, and then has its
+# coordinates swapped if swap.
+#
+# The canonical form of a position is, over every transform of the board, the
+# least tuple of
+#
+#     (occupied masks by seat, start cells by seat, pieces left by seat)
+#
+# where the start cell of a seat that has not placed a piece yet is the cell
+# y * m + x of its start corner, and -1 for any other seat. canonical returns
+# it with the transform that takes the position to it; restore takes a
+# placement found in the canonical form back to the board it came from.
+
+TRANSFORMS = [(swap, flip_x, flip_y) for swap in (False, True) for flip_x in (False, True)
+              for flip_y in (False, True)]
+IDENTITY = TRANSFORMS[0]
+
+
+def transforms(size):
+    """
+    Returns the transforms that take a board of the given size onto itself.
+    """
+    (n, m) = size
+    return [t for t in TRANSFORMS if n == m or not t[0]]
+
+
+def inverse(transform):
+    """
+    Returns the transform that undoes a transform.
+    """
+    (swap, flip_x, flip_y) = transform
+    # mirroring after the swap is the same as mirroring the other axis before it
+    return (swap, flip_y, flip_x) if swap else transform
+
+
+def transform_point(point, transform, size):
+    (n, m) = size
+    (x, y) = point
+    (swap, flip_x, flip_y) = transform
+    if flip_x:
+        x = m - 1 - x
+    if flip_y:
+        y = n - 1 - y
+    return (y, x) if swap else (x, y)
+
+
+def transform_points(points, transform, size):
+    """
+    Returns the list of points transformed on a board of the given size.
+    """
+    return [transform_point(point, transform, size) for point in points]
+
+
+def restore(points, transform, size):
+    """
+    Returns the points of a placement of the canonical form of a position,
+    given the transform that took the position to it, on the board of the
+    position.
+    """
+    return transform_points(points, inverse(transform), size)
+
+
+def transform_array(array, transform):
+    """
+    Returns an array of cells, indexed [..., y, x], transformed.
+    """
+    (swap, flip_x, flip_y) = transform
+    if flip_x:
+        array = array[..., :, ::-1]
+    if flip_y:
+        array = array[..., ::-1, :]
+    return np.swapaxes(array, -1, -2) if swap else array
+
+
+def canonical(size, occupied, pieces, order, starts=None):
+    """
+    Returns the canonical form of a position and the transform that takes
+    the position to it, given the occupied masks and the piece IDs left by
+    label, the labels in their order of play from the player to move, and
+    the start corner by label of the players yet to place a piece.
+    """
+    (n, m) = size
+    starts = starts or {}
+    cells = np.stack([mask_array(occupied.get(label, 0), size) for label in order])
+    corners = np.zeros((len(order), n, m), dtype=bool)
+    for (i, label) in enumerate(order):
+        if label in starts:
+            (x, y) = starts[label]
+            corners[i, y, x] = True
+    left = tuple(tuple(sorted(pieces.get(label, ()))) for label in order)
+
+    best = None
+    for transform in transforms(size):
+        masks = tuple(array_mask(plane) for plane in transform_array(cells, transform))
+        corner = tuple(int(np.argmax(plane)) if plane.any() else -1
+                       for plane in transform_array(corners, transform).reshape(len(order), -1))
+        form = (masks, corner, left)
+        if best is None or form < best[0]:
+            best = (form, transform)
+    return best
+
+
+def canonical_game(game):
+    """
+    Returns the canonical form of a game's position with the first of its
+    players to move, the transform that takes it there, and the labels of
+    the players by seat.
+    """
+    board = game.board
+    order = [player.label for player in game.players]
+    pieces = {player.label: [piece.ID for piece in player.pieces] for player in game.players}
+    starts = {player.label: min(player.corners) for player in game.players
+              if not board.occupied.get(player.label) and player.corners}
+    (form, transform) = canonical(board.size, board.occupied, pieces, order, starts)
+    return form, transform, order
+
+
+def canonical_key(form):
+    """
+    Returns the 64 bit Zobrist key of a canonical form, the same for
+    every position of its class.
+    """
+    total = 0
+    (masks, corners, left) = form
+    for (seat, mask) in enumerate(masks):
+        while mask:
+            low = mask & -mask
+            total ^= key("cell", seat, low.bit_length() - 1)
+            mask ^= low
+    for (seat, cell) in enumerate(corners):
+        if cell >= 0:
+            total ^= key("start", seat, cell)
+    for (seat, pieces) in enumerate(left):
+        for ID in pieces:
+            total ^= key("left", seat, ID)
+    return total
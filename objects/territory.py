@@ -0,0 +1,164 @@
+import numpy as np
+from .player import Evaluator, score_cells
+from .render import mask_array
+
+# Here we implement the territory of a board: the cells that each player can
+# still cover, kept as bitmasks of the board (see board.py) and updated with
+# every placement, so they never need the whole board scanned again.
+#
+# The reach of a player is the set of empty cells it may cover that are
+# connected, through edges or corners, to one of its anchors (or its start
+# corner, before its first piece) without crossing a cell it may not cover,
+# in fewer steps than the squares the player has left to place. Every later
+# piece of the player covers cells of its reach, and every new anchor is next
+# to such a piece, so a reach only ever shrinks: after a placement it is
+# filled again from the anchors within the old reach, and not at all when the
+# placement leaves it alone.
+#
+# A flood fill spreads over a mask one step at a time with a few shifts of
+# the whole mask, so it costs one step per cell of the longest path it takes
+# rather than one per cell. A board tracks its territory, once given one by
+# track, through its place and undo. No placement ever covers a cell outside
+# every reach, so a player with an empty reach has no placement left, and a
+# player whose reach no other player shares is isolated: it no longer
+# interacts with the others at all, and never will again, as reaches only
+# shrink (see strategies/search.py and strategies/endgame.py).
+
+
+class Territory:
+    """
+    The reaches of the players of a board, given the start corner and the
+    squares left to place by label of every player, kept up to date with
+    the board's placements.
+    """
+
+    def __init__(self, board, starts, squares):
+        self.board = board
+        self.starts = starts
+        self.squares = squares
+        self.reach = dict((label, self.flood(self.seeds(label), self.allowed(label), squares[label]))
+                          for label in starts)
+        # (reach, squares) before each placement, most recent last
+        self.journal = []
+
+    def allowed(self, label):
+        """
+        Returns the mask of the cells the player with the given label may cover.
+        """
+        board = self.board
+        return board.cells & ~board.filled & ~board.forbidden.get(label, 0)
+
+    def seeds(self, label):
+        """
+        Returns the mask of the cells the player with the given label can
+        place its next piece on.
+        """
+        board = self.board
+        if board.occupied.get(label):
+            return board.anchors.get(label, 0)
+        if self.starts.get(label) is None:
+            return 0
+        return (board.mask([self.starts[label]]) or 0) & self.allowed(label)
+
+    def flood(self, seeds, within, squares):
+        """
+        Returns the cells of within connected to seeds through edges or
+        corners, that a chain of at most squares cells starting on a seed
+        can get to.
+        """
+        s = self.board.stride
+        reached = seeds & within if squares > 0 else 0
+        for step in range(squares - 1):
+            grown = reached | (reached << 1) | (reached >> 1)
+            grown = (grown | (grown << s) | (grown >> s)) & within
+            if grown == reached:
+                break
+            reached = grown
+        return reached
+
+    def place(self, label, mask):
+        """
+        Updates the territory after the board placed a mask for the player
+        with the given label.
+        """
+        self.journal.append((self.reach, self.squares))
+        if label in self.squares:
+            self.squares = dict(self.squares)
+            self.squares[label] -= bin(mask).count("1")
+        reach = dict(self.reach)
+        for (other, cells) in reach.items():
+            if other == label or cells & mask:
+                within = cells & self.allowed(other)
+                reach[other] = self.flood(self.seeds(other), within, self.squares[other])
+        self.reach = reach
+
+    def undo(self):
+        """
+        Takes back the most recent placement.
+        """
+        (self.reach, self.squares) = self.journal.pop()
+
+    def contested(self):
+        """
+        Returns the mask of the cells more than one player can reach.
+        """
+        (once, twice) = (0, 0)
+        for cells in self.reach.values():
+            twice |= once & cells
+            once |= cells
+        return twice
+
+    def isolated(self):
+        """
+        Returns the labels of the players whose reach no other player shares.
+        """
+        contested = self.contested()
+        return set(label for (label, cells) in self.reach.items() if not cells & contested)
+
+
+def territory_of(game):
+    """
+    Returns the territory of a game's board, for the game's players.
+    """
+    board = game.board
+    # a player's corners are only its start corner until its first piece
+    starts = dict((p.label, min(p.corners) if p.corners and not board.occupied.get(p.label) else None)
+                  for p in game.players)
+    squares = dict((p.label, sum(piece.size for piece in p.pieces)) for p in game.players)
+    return Territory(board, starts, squares)
+
+
+def track(game):
+    """
+    Gives a game's board a territory to keep up to date, and returns it.
+    """
+    game.board.territory = territory_of(game)
+    return game.board.territory
+
+
+class TerritoryEvaluator(Evaluator):
+    """
+    Scores candidates as eval_move does, plus weight times the cells they
+    cover that an opponent could otherwise have covered, so contested
+    territory is taken before territory no one else can reach.
+    """
+
+    def __init__(self, weight=1):
+        self.weight = weight
+
+    def start(self, game):
+        # tracked from the start, the territory is never built again
+        if game.board.territory is None:
+            track(game)
+
+    def score_cells(self, cells, corners, player, game, weights):
+        board = game.board
+        territory = board.territory if board.territory is not None else territory_of(game)
+        (n, m) = board.size
+        theirs = np.zeros(n * m + 1, dtype=np.int64)
+        for (label, reach) in territory.reach.items():
+            if label != player.label:
+                theirs[:n * m] += mask_array(reach, board.size).ravel()
+        denied = (theirs[cells] > 0).sum(axis=1)
+        return score_cells(cells, corners, player, game, weights) + self.weight * denied
+
@@ -0,0 +1,97 @@
+import random
+
+
+# Here we implement Zobrist hashing of game states and a transposition table.
+#
+# Every (player label, cell) pair, every (player label, piece ID) pair and
+# every player label to move has a random 64 bit key. The key of a position
+# is the XOR of the keys of its occupied cells, of the pieces that have been
+# played (which determines the pieces that remain) and of the player to move.
+# Since XOR is its own inverse, the board can update its key with every
+# placement and undo, and the same position reached through placements made
+# in a different order gets the same key.
+
+_keys = {}
+
+
+def key(*parts):
+    """
+    Returns the random 64 bit key of a tuple of parts. Each key is drawn the
+    first time it is asked for, from a generator seeded with the parts, so
+    keys are the same in every process.
+    """
+    if parts not in _keys:
+        _keys[parts] = random.Random(repr(parts)).getrandbits(64)
+    return _keys[parts]
+
+
+def cell_key(label, index):
+    """
+    Returns the key of the player with the given label covering
+    the cell with the given bit index on a board.
+    """
+    return key("cell", label, index)
+
+
+def piece_key(label, ID):
+    """
+    Returns the key of the player with the given label having
+    played the piece with the given ID.
+    """
+    return key("piece", label, ID)
+
+
+def turn_key(label):
+    """
+    Returns the key of the player with the given label being next to move.
+    """
+    return key("turn", label)
+
+
+class TranspositionTable:
+    """
+    A bounded table of results keyed by position key. Each key has one slot,
+    key % size, holding a (key, depth, value, flag, move, generation) tuple.
+    A slot is replaced by a result of the same or a greater depth, or by any
+    result if its own is from an earlier search, so the deepest (costliest)
+    results of the current search are kept. The flag records whether the
+    value is exact or only a lower or upper bound, as found by alpha-beta.
+    """
+
+    EXACT = 0
+    LOWER = 1
+    UPPER = 2
+
+    def __init__(self, size=2 ** 16):
+        self.size = size
+        self.slots = [None] * size
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def new_search(self):
+        """
+        Marks every result stored so far as belonging to an earlier search.
+        """
+        self.generation += 1
+
+    def probe(self, key):
+        """
+        Returns the entry stored for a key, or None, counting hits and misses.
+        """
+        entry = self.slots[key % self.size]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+
+    def store(self, key, depth, value, flag=EXACT, move=None):
+        """
+        Stores a result for a key, unless its slot holds a deeper
+        result of the current search for another key.
+        """
+        index = key % self.size
+        entry = self.slots[index]
+        if entry is None or entry[0] == key or entry[5] != self.generation or depth >= entry[1]:
+            self.slots[index] = (key, depth, value, flag, move, self.generation)
@@ -0,0 +1,74 @@
+from objects.shape_map import I1, I2, I3, I4, I5, V3, V5, L4, L5, Z4, Z5, O4, T4, T5, N, P, W, U, F, X, Y
+from objects.player import Player
+from objects.board import Board
+from objects.blokus import Blokus
+from objects.metrics import Console
+from strategies.user import user_player
+from strategies.greedy import greedy_player
+from strategies.minimax import minimax_player
+from strategies.random_player import random_player
+
+
+# The game played by "Play Blokus.py", or by `python play.py`: you play blue
+# against a greedy, a minimax and a random computer player, and the board is
+# drawn with MatplotLib after every turn. Importing this module starts nothing
+# and loads no MatplotLib; that only happens once main draws the first board.
+
+a_weights = [2, 1]
+b_weights = [1, 2]
+minimax_weights = [2, 1, 5, 1, 1]
+
+
+def new_game():
+    """
+    Returns a new game of Blokus between the standard four players.
+    """
+    all_shapes = [I1(), I2(), I3(), I4(), I5(),
+                  V3(), L4(), Z4(), O4(), L5(),
+                  T5(), V5(), N(), Z5(), T4(),
+                  P(), W(), U(), F(), X(), Y()]
+
+    first = Player("A", "Computer_Red", greedy_player, a_weights)
+    second = Player("B", "Computer_Blue", user_player, b_weights)
+    third = Player("C", "Computer_Green", minimax_player, minimax_weights)
+    fourth = Player("D", "Computer_Yellow", random_player, a_weights)
+
+    standard_size = Board(20, 20, "_")
+
+    ordering = [first, second, third, fourth]
+    # random.shuffle(ordering)
+    return Blokus(ordering, standard_size, all_shapes)
+
+
+def main():
+    from matplotlib import rcParams
+
+    rcParams['figure.figsize'] = (6, 6)
+    rcParams['figure.dpi'] = 150
+
+    user_blokus = new_game()
+    # report every turn and how long the computer players take on the console
+    user_blokus.metrics = Console()
+
+    user_blokus.board.print_board(num=user_blokus.rounds, fancy=True)
+    user_blokus.play()
+    user_blokus.board.print_board(num=user_blokus.rounds, fancy=True)
+
+    while user_blokus.winner() == "None":
+        user_blokus.play()
+        user_blokus.board.print_board(num=user_blokus.rounds, fancy=True)
+        for p in user_blokus.players:
+            # print(f"{p.name} ( {str(p.score)}) : {str([s.ID for s in p.pieces])}")
+            print(f"{p.name} ({str(p.score)})")
+        print("=======================================================================")
+
+    print("The final scores are...")
+
+    by_name = sorted(user_blokus.players, key=lambda player: player.name)
+
+    for p in by_name:
+        print(f"{p.name} : {str(p.score)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+import importlib
+
+# The names below are imported from their modules the first time they are
+# used rather than with the package, so that running one of the modules with
+# python -m (python -m simulation.tournament) does not find it imported
+# already, and importing the package does not load every module.
+
+EXPORTS = {
+    "STRATEGIES": "runner",
+    "new_game": "runner",
+    "play_game": "runner",
+    "run_games": "runner",
+    "Tournament": "tournament",
+    "Dataset": "dataset",
+    "ShardWriter": "dataset",
+}
+__all__ = list(EXPORTS)
+
+
+def __getattr__(name):
+    if name not in EXPORTS:
+        raise AttributeError("module " + repr(__name__) + " has no attribute " + repr(name))
+    return getattr(importlib.import_module("." + EXPORTS[name], __name__), name)
@@ -0,0 +1,206 @@
+import argparse
+import os
+from objects.blokus import Blokus
+from objects.board import Board
+from objects.book import book_code, book_key, write_book
+from objects.game import start_corners
+from objects.player import Player, eval_moves
+from objects.record import RecordReader
+from objects.shape_map import SHAPES
+from objects.symmetry import canonical, canonical_key
+from .dataset import PIECE_IDS, seats
+from .runner import LABELS, STRATEGIES, is_evaluator, load_evaluator, parse_player, player_name
+
+
+# Opening books (see objects/book.py) are built offline in one of two ways:
+#
+# - by search: starting from the empty board, the position of every ply is
+#   searched by a strategy, usually a deep minimax, and its placement goes in
+#   the book. The positions of the next ply are those after the placement
+#   found and after the next best placements by eval_move, so that the book
+#   still has an answer when an opponent plays something else. Positions of
+#   the same canonical form are searched once, and the positions of a ply are
+#   searched in a pool of workers.
+# - from games: the placements of the first plies of the games in files of
+#   game records (written by python -m simulation --record) are counted,
+#   with the share of the win their player went on to get, and every
+#   position gets the placement with the best share over at least a given
+#   number of games.
+#
+#     python -m simulation.book --player minimax:2,1,5,1,1,7,3 --plies 4 --out openings.book
+#     python -m simulation.book --records games.blks --plies 8 --out openings.book
+#     python -m simulation --player minimax:2,1,5,1,1@openings.book ...
+
+PLIES = 4
+BRANCH = 3
+MIN_GAMES = 5
+
+
+def placing(points):
+    """
+    Returns a strategy that makes the placement covering points.
+    """
+    def strategy(player, game, weights):
+        target = game.board.mask(points)
+        for piece in player.possible_moves(player.pieces, game):
+            if game.board.mask(piece.points) == target:
+                return piece
+        return None
+    return strategy
+
+
+def replay(moves, players, size):
+    """
+    Returns the game between the given number of players after the
+    placements of moves, given as lists of points, made in turn.
+    """
+    ordering = [Player(LABELS[i], LABELS[i], None, []) for i in range(players)]
+    game = Blokus(ordering, Board(size, size, "_"), [shape() for shape in SHAPES])
+    game.start()
+    for points in moves:
+        game.players[0].strategy = placing(points)
+        game.play()
+    return game
+
+
+def search_job(job):
+    """
+    Searches the position after the placements of a job (moves, player,
+    players, size, branch) and returns its key, the placement found as
+    kept in a book (None if there is none), and the (key, moves) of the
+    positions after it and after the next best placements.
+    """
+    (moves, config, players, size, branch) = job
+    (name, weights, *paths) = config
+    game = replay(moves, players, size)
+    player = game.players[0]
+    player.weights = weights
+    for path in paths:
+        if is_evaluator(path):
+            player.evaluator = load_evaluator(path)
+            player.evaluator.start(game)
+    (key, transform) = book_key(game)
+
+    piece = STRATEGIES[name](player, game, weights)
+    if piece is None:
+        return key, None, []
+    scored = eval_moves(player.possible_moves(player.pieces, game), player, game, weights, player.evaluator)
+    scored.sort(key=lambda move: move[1], reverse=True)
+    children = []
+    for points in [piece.points] + [move.points for (move, score) in scored]:
+        if len(children) == branch:
+            break
+        child = moves + [list(points)]
+        child_key = book_key(replay(child, players, size))[0]
+        if child_key not in [other for (other, ignored) in children]:
+            children.append((child_key, child))
+    return key, book_code(piece.points, transform, game.board.size), children
+
+
+def build_search(config, plies=PLIES, branch=BRANCH, players=4, size=20, workers=1):
+    """
+    Returns the entries of a book of the placements found by the strategy
+    of a (strategy, weights, *paths) player in the first plies.
+    """
+    entries = {}
+    frontier = [[]]
+    pool = None
+    if workers > 1:
+        import multiprocessing
+
+        pool = multiprocessing.Pool(workers)
+    try:
+        for ply in range(plies):
+            jobs = [(moves, config, players, size, branch) for moves in frontier]
+            results = pool.map(search_job, jobs) if pool else list(map(search_job, jobs))
+            frontier = []
+            queued = set()
+            for (key, code, children) in results:
+                if code is None:
+                    continue
+                entries[key] = (code, 0, 0.0)
+                for (child_key, child) in children:
+                    if child_key not in entries and child_key not in queued:
+                        queued.add(child_key)
+                        frontier.append(child)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return entries
+
+
+def build_records(paths, plies=PLIES, min_games=MIN_GAMES):
+    """
+    Returns the entries of a book of the placements that did best in the
+    first plies of the games in files of game records, and the board size.
+    """
+    # key -> placement -> [games, share of the wins]
+    stats = {}
+    size = None
+    for path in paths:
+        with RecordReader(path) as reader:
+            for record in reader:
+                size = record.size
+                board = Board(size[0], size[1], "_")
+                labels = [p["label"] for p in record.header["players"]]
+                scores = {p["label"]: p["score"] for p in record.header["players"]}
+                winners = [label for label in labels if scores[label] == max(scores.values())]
+                corner = dict(zip(labels, start_corners(size)))
+                occupied = {label: 0 for label in labels}
+                pieces = {label: set(PIECE_IDS) for label in labels}
+
+                for (label, ID, index, points) in record.placements(plies):
+                    order = seats(label, labels)
+                    starts = {other: corner[other] for other in order if not occupied[other]}
+                    (form, transform) = canonical(size, occupied, pieces, order, starts)
+                    counts = stats.setdefault(canonical_key(form), {})
+                    count = counts.setdefault(book_code(points, transform, size), [0, 0.0])
+                    count[0] += 1
+                    count[1] += 1 / len(winners) if label in winners else 0
+                    occupied[label] |= board.mask(points)
+                    pieces[label].discard(ID)
+
+    entries = {}
+    for (key, counts) in stats.items():
+        played = [(share / games, games, code) for (code, (games, share)) in counts.items() if games >= min_games]
+        if played:
+            (value, games, code) = max(played)
+            entries[key] = (code, games, value)
+    return entries, size
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m simulation.book",
+                                     description="Builds an opening book by searching the first plies or from the records of games.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--player", type=parse_player,
+                        help="strategy:w1,w2,...[@evaluator.npz] that searches the positions of the book")
+    source.add_argument("--records", action="append", help="file of game records to count placements in")
+    parser.add_argument("--plies", type=int, default=PLIES, help="placements from the start of a game the book covers")
+    parser.add_argument("--branch", type=int, default=BRANCH,
+                        help="placements after which the positions of the next ply are searched")
+    parser.add_argument("--players", type=int, default=4, help="number of players of the games searched (2 to 4)")
+    parser.add_argument("--min-games", type=int, default=MIN_GAMES,
+                        help="games a placement must have been played in to go in the book")
+    parser.add_argument("--size", type=int, default=20, help="width and height of the board searched")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--out", required=True, help="book file to write")
+    args = parser.parse_args(argv)
+
+    if args.player:
+        if not 2 <= args.players <= 4:
+            parser.error("a game needs between 2 and 4 players")
+        entries = build_search(args.player, args.plies, args.branch, args.players, args.size, args.workers)
+        size = (args.size, args.size)
+        write_book(args.out, entries, size, plies=args.plies, method="search", player=player_name(args.player))
+    else:
+        (entries, size) = build_records(args.records, args.plies, args.min_games)
+        if size is None:
+            parser.error("no games in " + ", ".join(args.records))
+        write_book(args.out, entries, size, plies=args.plies, method="games", games=args.records)
+    print(f"{len(entries)} positions written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
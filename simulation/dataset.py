@@ -0,0 +1,203 @@
+import json
+import os
+import random
+import numpy as np
+from objects.render import mask_array
+from objects.shape_map import SHAPES
+
+# A dataset of positions for training evaluators, kept in a directory as
+# shards: .npy files of a fixed number of rows, each opened as a numpy.memmap,
+# and a manifest listing the shards and how many of their rows are filled.
+#
+# Every row is one position, seen by the player to move, and what happened:
+#
+# - planes: the cells covered by each player, the player to move first and
+#   the others in their order of play, as bits packed with np.packbits
+#   (see planes to unpack them into a (rows, 4, n, m) array).
+# - pieces: 1 for every piece, in the order of SHAPES, that each player
+#   (in the same order) has not placed yet.
+# - mover: the position of the player to move's label in LABELS.
+# - orientation, cell: the placement it made, as the global orientation index
+#   and the top left cell y * m + x of its bounding box (see objects/record.py).
+# - outcome: its share of the win at the end of the game (1 for a win,
+#   1 / k for a tie between k players, 0 for a loss).
+# - scores: the final score of each player, in the same order.
+# - starts: the start cell y * m + x of each player, in the same order, that
+#   has not placed a piece yet, and -1 for the others.
+#
+# Rows may be written in the canonical form of their position (see
+# objects/symmetry.py), turned and mirrored so that positions that play the
+# same are the same rows; the placement and start cells are then turned with
+# them.
+#
+# Each writer has shards of its own, named after its prefix, so that any
+# number of processes can write to the same directory at once. A shard is
+# added to the manifest (a line of JSON in manifest.jsonl, appended in a
+# single write) only once it is closed, so readers only see finished shards.
+
+LABELS = "ABCD"
+PIECE_IDS = [shape().ID for shape in SHAPES]
+MANIFEST = "manifest.jsonl"
+SHARD_ROWS = 2 ** 16
+
+
+def row_dtype(size):
+    """
+    Returns the numpy dtype of a row for a board of the given size.
+    """
+    (n, m) = size
+    return np.dtype([
+        ("planes", np.uint8, ((len(LABELS) * n * m + 7) // 8,)),
+        ("pieces", np.uint8, (len(LABELS), len(PIECE_IDS))),
+        ("mover", np.uint8),
+        ("orientation", np.int16),
+        ("cell", np.int16),
+        ("outcome", np.float32),
+        ("scores", np.int16, (len(LABELS),)),
+        ("starts", np.int16, (len(LABELS),)),
+    ])
+
+
+def seats(mover, players):
+    """
+    Returns the labels of the players in their order of play, starting with
+    the player to move.
+    """
+    labels = sorted(players)
+    i = labels.index(mover)
+    return labels[i:] + labels[:i]
+
+
+def position_planes(occupied, size, order):
+    """
+    Returns the packed planes of a board of the given size, given its
+    occupied masks by label, one plane for every label of order.
+    """
+    planes = np.zeros((len(LABELS),) + tuple(size), dtype=np.uint8)
+    for (i, label) in enumerate(order):
+        if label in occupied:
+            planes[i] = mask_array(occupied[label], size)
+    return np.packbits(planes)
+
+
+def planes(rows, size):
+    """
+    Returns the planes of rows unpacked into a (rows, 4, n, m) array of 0 and 1.
+    """
+    (n, m) = size
+    bits = np.unpackbits(rows["planes"], axis=1)[:, :len(LABELS) * n * m]
+    return bits.reshape((len(rows), len(LABELS), n, m))
+
+
+class ShardWriter:
+    """
+    Writes rows to the shards of a dataset directory named after prefix,
+    opening a new shard whenever one is full.
+    """
+
+    def __init__(self, directory, prefix, size, shard_rows=SHARD_ROWS):
+        self.directory = directory
+        self.prefix = prefix
+        self.size = size
+        self.dtype = row_dtype(size)
+        self.shard_rows = shard_rows
+        self.shards = 0
+        self.shard = None
+        self.path = None
+        self.rows = 0
+        self.games = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def open(self):
+        name = f"{self.prefix}-{self.shards:04d}.npy"
+        self.path = os.path.join(self.directory, name)
+        self.shard = np.lib.format.open_memmap(self.path, mode="w+", dtype=self.dtype, shape=(self.shard_rows,))
+        self.shards += 1
+        self.rows = 0
+        self.games = 0
+
+    def write(self, rows):
+        """
+        Writes a structured array of rows, all from the same game.
+        """
+        start = 0
+        while start < len(rows):
+            if self.shard is None:
+                self.open()
+            count = min(len(rows) - start, self.shard_rows - self.rows)
+            self.shard[self.rows:self.rows + count] = rows[start:start + count]
+            self.rows += count
+            start += count
+            if self.rows == self.shard_rows:
+                # the game counts in every shard that has rows of it
+                self.games += 1
+                self.finish()
+        if self.shard is not None:
+            self.games += 1
+
+    def finish(self):
+        """
+        Flushes the shard being written and adds it to the manifest.
+        """
+        self.shard.flush()
+        del self.shard
+        self.shard = None
+        line = json.dumps({"shard": os.path.basename(self.path), "rows": self.rows,
+                           "games": self.games, "size": list(self.size)}) + "\n"
+        # one write to a file opened for appending, so that lines from
+        # different processes are never mixed up
+        fd = os.open(os.path.join(self.directory, MANIFEST), os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+        try:
+            os.write(fd, line.encode())
+        finally:
+            os.close(fd)
+
+    def close(self):
+        if self.shard is not None and self.rows > 0:
+            self.finish()
+
+
+class Dataset:
+    """
+    Reads the finished shards of a dataset directory, without loading
+    more than a batch of rows into memory at once.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.shards = []
+        with open(os.path.join(directory, MANIFEST)) as f:
+            for line in f:
+                self.shards.append(json.loads(line))
+        self.shards.sort(key=lambda entry: entry["shard"])
+        self.size = tuple(self.shards[0]["size"]) if self.shards else None
+
+    def __len__(self):
+        return sum(entry["rows"] for entry in self.shards)
+
+    def shard(self, entry):
+        """
+        Returns the filled rows of a shard as a read-only memory map.
+        """
+        return np.load(os.path.join(self.directory, entry["shard"]), mmap_mode="r")[:entry["rows"]]
+
+    def batches(self, batch_size, shuffle=False, seed=0):
+        """
+        Yields structured arrays of up to batch_size rows. With shuffle, the
+        shards and the batches within each shard are read in a random order
+        and the rows of every batch are shuffled.
+        """
+        rng = random.Random(seed)
+        entries = list(self.shards)
+        if shuffle:
+            rng.shuffle(entries)
+        for entry in entries:
+            rows = self.shard(entry)
+            starts = list(range(0, len(rows), batch_size))
+            if shuffle:
+                rng.shuffle(starts)
+            for start in starts:
+                batch = np.array(rows[start:start + batch_size])
+                if shuffle:
+                    batch = batch[np.random.default_rng(rng.getrandbits(32)).permutation(len(batch))]
+                yield batch
@@ -0,0 +1,358 @@
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import numpy as np
+from .runner import parse_player, play_job
+from .tournament import rotations
+
+
+# The optimizer searches for the weights of a strategy that win the most
+# games against a fixed field of opponents. Some of the weights are tuned (by
+# default the ones that weigh the terms of eval_move and of the search) and
+# the others are kept as given. A candidate is scored by playing it at every
+# seat rotation against the opponents, on a few seeds:
+#
+#     fitness = mean share of the win + mean lead over the best opponent / 100
+#
+# where the lead, in squares, mostly breaks ties between candidates that win
+# as often as each other. Every candidate of a generation plays on the same
+# seeds (common random numbers), so that they are compared on the same games,
+# and the seeds change from one generation to the next so that no candidate is
+# fitted to a few games. Three ways of searching are possible:
+#
+# - random: candidates are drawn around the best candidate so far.
+# - genetic: the best half of the population is kept, and the rest is made of
+#   uniform crossovers of them with gaussian mutations.
+# - cmaes: the covariance matrix adaptation evolution strategy, which learns
+#   the shape and size of the distribution the candidates are drawn from.
+#
+# The search stops after a number of generations, or early once the best
+# fitness has not improved for a number of generations. After every generation
+# the optimizer is written to a checkpoint file it can be continued from, and
+# the best weights so far to an output file.
+#
+#     python -m simulation.optimize --strategy greedy --weights 2,1 \
+#         --opponent greedy:2,1 --opponent greedy:1,2 --opponent random \
+#         --method cmaes --generations 30 --checkpoint opt.json --out best.json
+
+# weights tuned by default, by strategy
+TUNED = {
+    "greedy": [0, 1],
+    "minimax": [0, 1, 3, 4],
+    "maxn": [0, 1, 3, 4],
+}
+
+
+class RandomSearch:
+    """
+    Draws every generation around the best candidate found so far.
+    """
+
+    def __init__(self, mean, sigma, population, rng):
+        self.mean = np.array(mean, dtype=float)
+        self.sigma = sigma
+        self.population = population
+        self.rng = rng
+
+    def ask(self):
+        return [self.mean] + [self.mean + self.sigma * self.rng.standard_normal(len(self.mean))
+                              for i in range(self.population - 1)]
+
+    def tell(self, candidates, fitnesses):
+        self.mean = np.array(candidates[int(np.argmax(fitnesses))])
+
+    def state(self):
+        return {"mean": self.mean.tolist()}
+
+    def load(self, state):
+        self.mean = np.array(state["mean"])
+
+
+class Genetic:
+    """
+    Keeps a population, replacing its worse half by mutated crossovers
+    of the better half every generation.
+    """
+
+    def __init__(self, mean, sigma, population, rng):
+        self.sigma = sigma
+        self.rng = rng
+        mean = np.array(mean, dtype=float)
+        self.members = [mean] + [mean + sigma * rng.standard_normal(len(mean)) for i in range(population - 1)]
+
+    def ask(self):
+        return list(self.members)
+
+    def tell(self, candidates, fitnesses):
+        ranked = [candidates[i] for i in np.argsort(fitnesses)[::-1]]
+        parents = ranked[:max(2, len(ranked) // 2)]
+        children = []
+        while len(parents) + len(children) < len(candidates):
+            (a, b) = self.rng.choice(len(parents), 2, replace=False)
+            take = self.rng.random(len(parents[a])) < 0.5
+            child = np.where(take, parents[a], parents[b])
+            children.append(child + self.sigma * self.rng.standard_normal(len(child)))
+        self.members = parents + children
+
+    def state(self):
+        return {"members": [m.tolist() for m in self.members]}
+
+    def load(self, state):
+        self.members = [np.array(m) for m in state["members"]]
+
+
+class CMAES:
+    """
+    The (mu / mu_w, lambda) covariance matrix adaptation evolution strategy,
+    with the default settings of Hansen's tutorial.
+    """
+
+    def __init__(self, mean, sigma, population, rng):
+        self.rng = rng
+        self.mean = np.array(mean, dtype=float)
+        self.sigma = sigma
+        self.population = population
+        n = len(self.mean)
+        self.mu = population // 2
+        weights = np.log(self.mu + 0.5) - np.log(np.arange(1, self.mu + 1))
+        self.weights = weights / weights.sum()
+        self.mueff = 1 / (self.weights ** 2).sum()
+        self.cc = (4 + self.mueff / n) / (n + 4 + 2 * self.mueff / n)
+        self.cs = (self.mueff + 2) / (n + self.mueff + 5)
+        self.c1 = 2 / ((n + 1.3) ** 2 + self.mueff)
+        self.cmu = min(1 - self.c1, 2 * (self.mueff - 2 + 1 / self.mueff) / ((n + 2) ** 2 + self.mueff))
+        self.damps = 1 + 2 * max(0, math.sqrt((self.mueff - 1) / (n + 1)) - 1) + self.cs
+        self.chi = math.sqrt(n) * (1 - 1 / (4 * n) + 1 / (21 * n ** 2))
+        self.pc = np.zeros(n)
+        self.ps = np.zeros(n)
+        self.C = np.eye(n)
+        self.generation = 0
+
+    def ask(self):
+        (values, vectors) = np.linalg.eigh(self.C)
+        scale = vectors * np.sqrt(np.maximum(values, 1e-20))
+        return [self.mean + self.sigma * scale @ self.rng.standard_normal(len(self.mean))
+                for i in range(self.population)]
+
+    def tell(self, candidates, fitnesses):
+        n = len(self.mean)
+        self.generation += 1
+        best = [np.array(candidates[i]) for i in np.argsort(fitnesses)[::-1][:self.mu]]
+        old = self.mean
+        self.mean = sum(w * x for (w, x) in zip(self.weights, best))
+        step = (self.mean - old) / self.sigma
+
+        (values, vectors) = np.linalg.eigh(self.C)
+        inverse_root = vectors @ np.diag(1 / np.sqrt(np.maximum(values, 1e-20))) @ vectors.T
+        self.ps = (1 - self.cs) * self.ps + math.sqrt(self.cs * (2 - self.cs) * self.mueff) * inverse_root @ step
+        norm = np.linalg.norm(self.ps) / math.sqrt(1 - (1 - self.cs) ** (2 * self.generation))
+        hsig = norm / self.chi < 1.4 + 2 / (n + 1)
+        self.pc = (1 - self.cc) * self.pc + hsig * math.sqrt(self.cc * (2 - self.cc) * self.mueff) * step
+
+        steps = [(x - old) / self.sigma for x in best]
+        rank_mu = sum(w * np.outer(y, y) for (w, y) in zip(self.weights, steps))
+        self.C = ((1 - self.c1 - self.cmu) * self.C
+                  + self.c1 * (np.outer(self.pc, self.pc) + (not hsig) * self.cc * (2 - self.cc) * self.C)
+                  + self.cmu * rank_mu)
+        self.sigma *= math.exp((self.cs / self.damps) * (norm / self.chi - 1))
+
+    def state(self):
+        return {"mean": self.mean.tolist(), "sigma": self.sigma, "pc": self.pc.tolist(),
+                "ps": self.ps.tolist(), "C": self.C.tolist(), "generation": self.generation}
+
+    def load(self, state):
+        self.mean = np.array(state["mean"])
+        self.sigma = state["sigma"]
+        self.pc = np.array(state["pc"])
+        self.ps = np.array(state["ps"])
+        self.C = np.array(state["C"])
+        self.generation = state["generation"]
+
+
+METHODS = {"random": RandomSearch, "genetic": Genetic, "cmaes": CMAES}
+
+
+def candidate_weights(weights, tuned, values):
+    """
+    Returns the weights with the tuned ones replaced by values.
+    """
+    weights = list(weights)
+    for (i, value) in zip(tuned, values):
+        weights[i] = float(value)
+    return weights
+
+
+def fitness(results, seat):
+    """
+    Returns the fitness of the player at seat from the records of its games.
+    """
+    total = 0
+    for record in results:
+        scores = [p["score"] for p in record["players"]]
+        mine = scores[seat[record["game"]]]
+        best = max(scores)
+        others = max(s for (i, s) in enumerate(scores) if i != seat[record["game"]])
+        share = 1 / scores.count(best) if mine == best else 0
+        total += share + (mine - others) / 100
+    return total / len(results)
+
+
+class Optimizer:
+    """
+    Runs the search, keeping the best weights found and saving its progress.
+    """
+
+    def __init__(self, strategy, weights, tuned, opponents, method="cmaes", population=8, sigma=0.5,
+                 seeds=4, generations=20, patience=5, seed=0, size=20, checkpoint=None, out=None):
+        self.strategy = strategy
+        self.weights = list(weights)
+        self.tuned = tuned
+        self.opponents = opponents
+        self.method = method
+        self.population = population
+        self.sigma = sigma
+        self.seeds = seeds
+        self.generations = generations
+        self.patience = patience
+        self.seed = seed
+        self.size = size
+        self.checkpoint = checkpoint
+        self.out = out
+        self.rng = np.random.default_rng(seed)
+        self.search = METHODS[method]([weights[i] for i in tuned], sigma, population, self.rng)
+        self.generation = 0
+        self.best = None
+        self.best_fitness = -math.inf
+        self.stale = 0
+        self.log = []
+
+    def games(self, candidates):
+        """
+        Returns the jobs of the games of a generation, and the seat of
+        the candidate in each of them, by game number.
+        """
+        jobs = []
+        seat = {}
+        table = [None] + [tuple(o) for o in self.opponents]
+        for (c, values) in enumerate(candidates):
+            player = (self.strategy, candidate_weights(self.weights, self.tuned, values))
+            for s in range(self.seeds):
+                # the same seeds for every candidate of the generation
+                game_seed = self.seed + self.generation * self.seeds + s
+                for order in rotations(list(range(len(table)))):
+                    number = len(jobs)
+                    seat[number] = order.index(0)
+                    players = [player if i == 0 else table[i] for i in order]
+                    jobs.append((number, players, game_seed, self.size, False, False))
+        return jobs, seat
+
+    def evaluate(self, candidates, pool):
+        (jobs, seat) = self.games(candidates)
+        results = list(pool.imap(play_job, jobs)) if pool else list(map(play_job, jobs))
+        per = len(jobs) // len(candidates)
+        return [fitness(results[c * per:(c + 1) * per], seat) for c in range(len(candidates))]
+
+    def run(self, workers=1):
+        pool = multiprocessing.Pool(workers) if workers > 1 else None
+        try:
+            while self.generation < self.generations and self.stale < self.patience:
+                candidates = self.search.ask()
+                fitnesses = self.evaluate(candidates, pool)
+                self.search.tell(candidates, fitnesses)
+                best = int(np.argmax(fitnesses))
+                if fitnesses[best] > self.best_fitness:
+                    self.best_fitness = fitnesses[best]
+                    self.best = candidate_weights(self.weights, self.tuned, candidates[best])
+                    self.stale = 0
+                else:
+                    self.stale += 1
+                self.log.append({"generation": self.generation, "best": fitnesses[best],
+                                 "mean": float(np.mean(fitnesses))})
+                self.generation += 1
+                self.save()
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        return self.best, self.best_fitness
+
+    def state(self):
+        keys = ("strategy", "weights", "tuned", "opponents", "method", "population", "sigma", "seeds",
+                "generations", "patience", "seed", "size", "out", "generation", "best", "best_fitness",
+                "stale", "log")
+        state = {key: getattr(self, key) for key in keys}
+        state["search"] = self.search.state()
+        state["rng"] = self.rng.bit_generator.state
+        return state
+
+    def save(self):
+        if self.checkpoint is not None:
+            temporary = self.checkpoint + ".tmp"
+            with open(temporary, "w") as f:
+                json.dump(self.state(), f)
+            os.replace(temporary, self.checkpoint)
+        if self.out is not None and self.best is not None:
+            with open(self.out, "w") as f:
+                json.dump({"strategy": self.strategy, "weights": self.best, "fitness": self.best_fitness,
+                           "generations": self.generation}, f, indent=1)
+
+    @classmethod
+    def load(cls, checkpoint):
+        with open(checkpoint) as f:
+            state = json.load(f)
+        optimizer = cls(state["strategy"], state["weights"], state["tuned"], state["opponents"],
+                        state["method"], state["population"], state["sigma"], state["seeds"],
+                        state["generations"], state["patience"], state["seed"], state["size"],
+                        checkpoint, state["out"])
+        for key in ("generation", "best", "best_fitness", "stale", "log"):
+            setattr(optimizer, key, state[key])
+        optimizer.search.load(state["search"])
+        optimizer.rng.bit_generator.state = state["rng"]
+        return optimizer
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m simulation.optimize",
+                                     description="Searches for the weights of a strategy that win the most games.")
+    parser.add_argument("--strategy", choices=sorted(TUNED), default="greedy")
+    parser.add_argument("--weights", help="weights to start from, such as 2,1 or 2,1,5,1,1,1,2")
+    parser.add_argument("--tune", help="positions of the weights to tune, such as 0,1")
+    parser.add_argument("--opponent", action="append", type=parse_player, default=[],
+                        help="strategy:w1,w2,...[@evaluator.npz][@openings.book] once for every opponent (1 to 3)")
+    parser.add_argument("--method", choices=sorted(METHODS), default="cmaes")
+    parser.add_argument("--population", type=int, default=8, help="candidates in every generation")
+    parser.add_argument("--sigma", type=float, default=0.5, help="initial spread of the candidates")
+    parser.add_argument("--seeds", type=int, default=4, help="seeds every candidate plays at every rotation")
+    parser.add_argument("--generations", type=int, default=20)
+    parser.add_argument("--patience", type=int, default=5, help="generations without improvement before stopping")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--size", type=int, default=20, help="width and height of the board")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--checkpoint", help="file the optimizer is saved to, and continued from if it exists")
+    parser.add_argument("--out", help="JSON file to write the best weights to")
+    args = parser.parse_args(argv)
+
+    if args.checkpoint and os.path.exists(args.checkpoint):
+        optimizer = Optimizer.load(args.checkpoint)
+    else:
+        if not args.weights:
+            parser.error("--weights are needed to start a new search")
+        if not 1 <= len(args.opponent) <= 3:
+            parser.error("between 1 and 3 opponents are needed")
+        (strategy, weights) = parse_player(args.strategy + ":" + args.weights)
+        tuned = [int(i) for i in args.tune.split(",")] if args.tune else TUNED[strategy]
+        tuned = [i for i in tuned if i < len(weights)]
+        optimizer = Optimizer(strategy, weights, tuned, args.opponent, args.method, args.population,
+                              args.sigma, args.seeds, args.generations, args.patience, args.seed,
+                              args.size, args.checkpoint, args.out)
+
+    (best, score) = optimizer.run(args.workers)
+    for entry in optimizer.log:
+        print(f"generation {entry['generation']:3d}: best {entry['best']:.3f}, mean {entry['mean']:.3f}")
+    print(f"best weights {best} with fitness {score:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+from objects.blokus import Blokus
+from objects.board import Board
+from objects.book import load as load_book
+from objects.evaluator import load
+from objects.metrics import Collector
+from objects.record import GameRecord, RecordWriter
+from objects.player import Player
+from objects.shape_map import SHAPES
+from objects.territory import TerritoryEvaluator
+from strategies.greedy import greedy_player
+from strategies.mcts import mcts_player, mcts_leaf_player
+from strategies.minimax import minimax_player, maxn_player
+from strategies.random_player import random_player
+
+
+# The runner plays complete games of Blokus with no board drawn and nothing
+# printed, so that strategies can be compared over many games. Games are
+# farmed out to a pool of worker processes, and every game is played on its
+# own seed (the base seed plus the number of the game), so a run can be
+# repeated exactly whatever the number of workers. The result of every game
+# is written as one line of JSON as soon as it is finished.
+#
+#     python -m simulation --player greedy:2,1 --player random \
+#         --player minimax:2,1,5,1,1,2,2 --player random --games 1000 --out games.jsonl
+#
+# Strategies that run their own pool of workers (minimax and mcts) should be
+# given one worker in their weights when the games themselves run in parallel.
+
+STRATEGIES = {
+    "greedy": greedy_player,
+    "minimax": minimax_player,
+    "maxn": maxn_player,
+    "random": random_player,
+    "mcts": mcts_player,
+    "mcts_leaf": mcts_leaf_player,
+}
+
+LABELS = "ABCD"
+
+
+def parse_player(text):
+    """
+    Reads a player given as "strategy:w1,w2,..." into (strategy, weights),
+    followed by the paths of the files given after it with "@": an evaluator
+    (a .npz file, see objects/evaluator.py, or "territory:w" for eval_move
+    plus w times the opponents' territory taken, see objects/territory.py)
+    to score placements with, and an opening book (see objects/book.py) to play from while it can.
+    The weights default to [1, 1] when none are given.
+    """
+    (text, *paths) = text.split("@")
+    (name, _, weights) = text.partition(":")
+    if name not in STRATEGIES:
+        raise argparse.ArgumentTypeError(
+            "unknown strategy " + name + " (choose from " + ", ".join(STRATEGIES) + ")")
+    try:
+        weights = [float(w) if "." in w else int(w) for w in weights.split(",")] if weights else [1, 1]
+    except ValueError:
+        raise argparse.ArgumentTypeError("weights must be numbers: " + text)
+    return (name, weights, *paths)
+
+
+def player_name(player):
+    """
+    Returns the text a (strategy, weights, *paths) player is given as.
+    """
+    return "@".join([player[0] + ":" + ",".join(str(w) for w in player[1])] + list(player[2:]))
+
+
+def is_evaluator(path):
+    return path.endswith(".npz") or path.partition(":")[0] == "territory"
+
+
+def load_evaluator(path):
+    """
+    Returns the evaluator a path given after a player stands for.
+    """
+    (name, _, weight) = path.partition(":")
+    if name == "territory":
+        return TerritoryEvaluator(float(weight) if weight else 1)
+    return load(path)
+
+
+def new_game(players, size=20):
+    """
+    Returns a new Blokus game on a size by size board between the
+    players, given as a list of (strategy, weights, *paths).
+    """
+    ordering = []
+    for (i, (name, weights, *paths)) in enumerate(players):
+        player = Player(LABELS[i], LABELS[i] + "_" + name, STRATEGIES[name], weights)
+        for path in paths:
+            if is_evaluator(path):
+                player.evaluator = load_evaluator(path)
+            else:
+                player.book = load_book(path)
+        ordering.append(player)
+    return Blokus(ordering, Board(size, size, "_"), [shape() for shape in SHAPES])
+
+
+def play_game(players, seed, size=20, metrics=False, history=False):
+    """
+    Plays one game to the end on the given seed and returns its record:
+    the final scores, the winner, the number of placements and the
+    seconds taken by every turn, with metrics, the counters and
+    timers collected from the game, and with history, the (label, mask)
+    placements of the board.
+    """
+    random.seed(seed)
+    game = new_game(players, size)
+    if metrics:
+        game.metrics = Collector()
+    timings = []
+    tic = time.perf_counter()
+    game.play()
+    timings.append(time.perf_counter() - tic)
+    while game.winner() == "None":
+        tic = time.perf_counter()
+        game.play()
+        timings.append(time.perf_counter() - tic)
+
+    by_label = sorted(game.players, key=lambda player: player.label)
+    record = {
+        "seed": seed,
+        "players": [{"label": p.label, "strategy": config[0], "weights": config[1], "score": p.score}
+                    for (p, config) in zip(by_label, players)],
+        "winner": game.winner(),
+        "moves": len(game.board.history),
+        "rounds": game.rounds,
+        "timings": timings,
+    }
+    if metrics:
+        record["metrics"] = game.metrics.summary()
+    if history:
+        record["history"] = game.board.history
+    for (entry, config) in zip(record["players"], players):
+        for path in config[2:]:
+            entry["evaluator" if is_evaluator(path) else "book"] = path
+    return record
+
+
+def play_job(job):
+    """
+    Plays the game of a job (number, players, seed, size, metrics, history) in a worker.
+    """
+    (number, players, seed, size, metrics, history) = job
+    record = play_game(players, seed, size, metrics, history)
+    record["game"] = number
+    return record
+
+
+def run_games(players, games, seed=0, workers=1, size=20, start=0, metrics=False, history=False):
+    """
+    Plays the games numbered start to start + games - 1 and yields
+    their records, in the order they finish when workers > 1.
+    """
+    jobs = [(i, players, seed + i, size, metrics, history) for i in range(start, start + games)]
+    if workers <= 1:
+        for job in jobs:
+            yield play_job(job)
+        return
+
+    with multiprocessing.Pool(workers) as pool:
+        for record in pool.imap_unordered(play_job, jobs):
+            yield record
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m simulation",
+                                     description="Plays games of Blokus with no rendering and writes their results as JSON lines.")
+    parser.add_argument("--player", action="append", type=parse_player, required=True,
+                        help="strategy:w1,w2,...[@evaluator.npz][@openings.book] once for every player, in order of play (2 to 4 players)")
+    parser.add_argument("--games", type=int, default=1, help="number of games to play")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game, the next games use the following seeds")
+    parser.add_argument("--start", type=int, default=0, help="number of the first game, to continue an earlier run")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--size", type=int, default=20, help="width and height of the board")
+    parser.add_argument("--metrics", action="store_true", help="add the counters and timers of every game to its result")
+    parser.add_argument("--record", help="file of game records (see objects/record.py) to append every game to")
+    parser.add_argument("--out", default="-", help="JSONL file to append the results to (- for stdout)")
+    args = parser.parse_args(argv)
+
+    if not 2 <= len(args.player) <= 4:
+        parser.error("a game needs between 2 and 4 players")
+
+    out = sys.stdout if args.out == "-" else open(args.out, "a")
+    writer = RecordWriter(args.record) if args.record else None
+    try:
+        for record in run_games(args.player, args.games, args.seed, args.workers, args.size, args.start,
+                                args.metrics, writer is not None):
+            if writer is not None:
+                history = record.pop("history")
+                writer.write(GameRecord.from_history(
+                    history, (args.size, args.size), game=record["game"], seed=record["seed"],
+                    players=record["players"], winner=record["winner"]))
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        if writer is not None:
+            writer.close()
@@ -0,0 +1,150 @@
+import argparse
+import os
+import random
+import numpy as np
+from objects.game import start_corners
+from objects.record import normalize, BY_OFFSETS
+from objects.shape_map import ORIENTATIONS
+from objects.symmetry import canonical, transform_points
+from .dataset import LABELS, PIECE_IDS, SHARD_ROWS, Dataset, ShardWriter, position_planes, row_dtype, seats
+from .runner import new_game, parse_player
+
+
+# Self-play plays games between the strategies, as the batch runner does, and
+# writes every placement made as a row of a dataset (see dataset.py): the
+# position the player was in, the placement it chose and how the game ended
+# for it. Games are played in jobs of a few games each, spread over a pool of
+# workers, and every job writes shards of its own, named after its number, so
+# the workers never wait for each other. With --canonical, every row is
+# written in the canonical form of its position (see objects/symmetry.py).
+#
+#     python -m simulation.selfplay --player greedy:2,1 --player greedy:1,2 \
+#         --player random --player minimax:2,1,5,1,1,1,2 --games 10000 --dir data
+
+GAMES_PER_JOB = 64
+
+
+def play_rows(players, seed, size=20, canonical_rows=False):
+    """
+    Plays one game to the end on the given seed and returns the rows of
+    all of its placements, in the canonical form of their positions if
+    canonical_rows.
+    """
+    random.seed(seed)
+    game = new_game(players, size)
+    board = game.board
+    m = board.size[1]
+    corner = dict(zip([p.label for p in game.players], start_corners(board.size)))
+    made = []
+    game.play()
+    while True:
+        # the position before each placement is the board without it and
+        # the pieces of its player with it
+        if len(board.history) > len(made):
+            (label, mask) = board.history[-1]
+            made.append((label, mask, {p.label: [s.ID for s in p.pieces] for p in game.players}))
+        if game.winner() != "None":
+            break
+        game.play()
+
+    scores = {p.label: p.score for p in game.players}
+    best = max(scores.values())
+    winners = [label for label in scores if scores[label] == best]
+    rows = np.zeros(len(made), dtype=row_dtype(board.size))
+    occupied = {label: 0 for label in scores}
+    for (i, (label, mask, pieces)) in enumerate(made):
+        order = seats(label, scores)
+        points = board.points(mask)
+        pieces[label] = pieces[label] + [ORIENTATIONS[BY_OFFSETS[normalize(points)[1]]].ID]
+        starts = {other: corner[other] for other in order if not occupied[other]}
+
+        if canonical_rows:
+            (form, transform) = canonical(board.size, occupied, pieces, order, starts)
+            planes = dict(zip(order, form[0]))
+            cells = form[1]
+            points = transform_points(points, transform, board.size)
+        else:
+            planes = occupied
+            cells = [starts[other][1] * m + starts[other][0] if other in starts else -1 for other in order]
+        ((x, y), offsets) = normalize(points)
+
+        rows[i]["planes"] = position_planes(planes, board.size, order)
+        for (j, other) in enumerate(order):
+            rows[i]["pieces"][j] = [ID in pieces[other] for ID in PIECE_IDS]
+            rows[i]["scores"][j] = scores[other]
+            rows[i]["starts"][j] = cells[j]
+        rows[i]["mover"] = LABELS.index(label)
+        rows[i]["orientation"] = BY_OFFSETS[offsets]
+        rows[i]["cell"] = y * m + x
+        rows[i]["outcome"] = 1 / len(winners) if label in winners else 0
+        occupied[label] |= mask
+    return rows
+
+
+def play_job(job):
+    """
+    Plays the games of a job (number, players, seeds, size, directory,
+    shard_rows, canonical_rows) and writes their rows to shards of its own.
+    Returns the number of rows written.
+    """
+    (number, players, seeds, size, directory, shard_rows, canonical_rows) = job
+    writer = ShardWriter(directory, f"job{number:06d}", (size, size), shard_rows)
+    total = 0
+    for seed in seeds:
+        rows = play_rows(players, seed, size, canonical_rows)
+        writer.write(rows)
+        total += len(rows)
+    writer.close()
+    return total
+
+
+def run(players, games, directory, seed=0, workers=1, size=20, shard_rows=SHARD_ROWS,
+        games_per_job=GAMES_PER_JOB, start=0, canonical_rows=False):
+    """
+    Plays the games numbered start to start + games - 1 into the dataset in
+    directory and returns the number of rows written.
+    """
+    jobs = []
+    for first in range(start, start + games, games_per_job):
+        seeds = [seed + i for i in range(first, min(first + games_per_job, start + games))]
+        jobs.append((first // games_per_job, players, seeds, size, directory, shard_rows, canonical_rows))
+
+    if workers <= 1:
+        return sum(map(play_job, jobs))
+
+    import multiprocessing
+
+    with multiprocessing.Pool(workers) as pool:
+        return sum(pool.imap_unordered(play_job, jobs))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m simulation.selfplay",
+                                     description="Plays games of Blokus and writes every placement made as training data.")
+    parser.add_argument("--player", action="append", type=parse_player, required=True,
+                        help="strategy:w1,w2,...[@evaluator.npz][@openings.book] once for every player, in order of play (2 to 4 players)")
+    parser.add_argument("--games", type=int, default=1, help="number of games to play")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game")
+    parser.add_argument("--start", type=int, default=0,
+                        help="number of the first game, a multiple of --games-per-job, to add to an earlier run")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--size", type=int, default=20, help="width and height of the board")
+    parser.add_argument("--dir", required=True, help="directory of the dataset")
+    parser.add_argument("--shard-rows", type=int, default=SHARD_ROWS, help="rows in every shard")
+    parser.add_argument("--games-per-job", type=int, default=GAMES_PER_JOB, help="games played by a worker at a time")
+    parser.add_argument("--canonical", action="store_true",
+                        help="write every position in its canonical form, turned and mirrored")
+    args = parser.parse_args(argv)
+
+    if not 2 <= len(args.player) <= 4:
+        parser.error("a game needs between 2 and 4 players")
+    if args.start % args.games_per_job:
+        parser.error("--start must be a multiple of --games-per-job")
+
+    rows = run(args.player, args.games, args.dir, args.seed, args.workers, args.size,
+               args.shard_rows, args.games_per_job, args.start, args.canonical)
+    print(f"{rows} rows written, {len(Dataset(args.dir))} rows in {args.dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+from .runner import parse_player, play_job, player_name
+
+
+# A tournament plays configurations of strategies and weights against each
+# other and rates them with Elo. A game of n players counts as a match between
+# every pair of its players, won by the one with the higher final score (a
+# tie is half a win for both), and the rating change of every pair is divided
+# by n - 1 so that a game moves a rating about as much as a single match would.
+#
+# The players of a game are seated at every rotation of their order in turn,
+# as the first corners of Game.play are not worth the same, and every game of
+# the tournament has its own number and is played on the base seed plus that
+# number. Two kinds of schedule are possible:
+#
+# - round robin: every group of players plays at every table rotation,
+#   the whole schedule played as often as there are rounds.
+# - swiss: every round, the configurations are sorted by rating and seated
+#   in groups of neighbours, so that close ratings meet each other.
+#
+# The games of a round are played in a pool of workers, but their results are
+# rated in the order of their numbers so that a run is repeatable. After every
+# game the state of the tournament is written to a checkpoint file, which the
+# tournament continues from when it is started again.
+#
+#     python -m simulation.tournament --entry greedy:2,1 --entry greedy:1,2 \
+#         --entry random --entry minimax:2,1,5,1,1,1,2 --rounds 2 --checkpoint t.json
+
+INITIAL = 1500
+K = 32
+
+
+def expected(a, b):
+    """
+    Returns the chance that a rating a wins against a rating b.
+    """
+    return 1 / (1 + 10 ** ((b - a) / 400))
+
+
+def rate(ratings, entries, scores):
+    """
+    Updates ratings after a game between the entries, given in
+    seat order, which finished with the given scores.
+    """
+    n = len(entries)
+    change = {e: 0 for e in entries}
+    for (i, j) in itertools.combinations(range(n), 2):
+        (a, b) = (entries[i], entries[j])
+        result = 1 if scores[i] > scores[j] else 0 if scores[i] < scores[j] else 0.5
+        delta = K / (n - 1) * (result - expected(ratings[a], ratings[b]))
+        change[a] += delta
+        change[b] -= delta
+    for e in entries:
+        ratings[e] += change[e]
+
+
+def rotations(group):
+    """
+    Returns every seat order of a group where the players keep
+    their order of play, each of them starting once.
+    """
+    return [group[i:] + group[:i] for i in range(len(group))]
+
+
+def round_robin(names, seats):
+    """
+    Returns the tables of a round where every group of seats
+    entries plays at every rotation.
+    """
+    return [table for group in itertools.combinations(names, seats) for table in rotations(list(group))]
+
+
+def swiss(names, seats, ratings):
+    """
+    Returns the tables of a round where the entries, sorted by rating,
+    play in groups of neighbours at every rotation. The last group is
+    filled up with the entries just above it when it is short.
+    """
+    ranked = sorted(names, key=lambda e: (-ratings[e], names.index(e)))
+    groups = [ranked[i:i + seats] for i in range(0, len(ranked), seats)]
+    if len(groups[-1]) < seats:
+        groups[-1] = ranked[-seats:]
+    return [table for group in groups for table in rotations(group)]
+
+
+class Tournament:
+    """
+    Keeps the entries, their ratings and the progress of a tournament,
+    and saves them to a checkpoint file.
+    """
+
+    def __init__(self, entries, schedule, seats, rounds, seed=0, size=20, checkpoint=None):
+        # entries by name, as (strategy, weights)
+        self.entries = entries
+        self.names = list(entries)
+        self.schedule = schedule
+        self.seats = seats
+        self.rounds = rounds
+        self.seed = seed
+        self.size = size
+        self.checkpoint = checkpoint
+        self.ratings = {e: INITIAL for e in self.names}
+        self.games = {e: 0 for e in self.names}
+        self.wins = {e: 0 for e in self.names}
+        # the round being played, its tables and the number of its first game
+        self.round = 0
+        self.tables = None
+        self.first = 0
+        # numbers of the games of the round already rated
+        self.done = []
+
+    def state(self):
+        return {key: getattr(self, key) for key in
+                ("entries", "schedule", "seats", "rounds", "seed", "size", "ratings",
+                 "games", "wins", "round", "tables", "first", "done")}
+
+    def save(self):
+        """
+        Writes the tournament to its checkpoint file, replacing the
+        old one only once the new one is complete.
+        """
+        if self.checkpoint is None:
+            return
+        temporary = self.checkpoint + ".tmp"
+        with open(temporary, "w") as f:
+            json.dump(self.state(), f, indent=1)
+        os.replace(temporary, self.checkpoint)
+
+    @classmethod
+    def load(cls, checkpoint):
+        """
+        Returns the tournament saved in a checkpoint file.
+        """
+        with open(checkpoint) as f:
+            state = json.load(f)
+        entries = {e: tuple(config) for (e, config) in state["entries"].items()}
+        tournament = cls(entries, state["schedule"], state["seats"], state["rounds"],
+                         state["seed"], state["size"], checkpoint)
+        for key in ("ratings", "games", "wins", "round", "tables", "first", "done"):
+            setattr(tournament, key, state[key])
+        return tournament
+
+    def pairings(self):
+        if self.schedule == "swiss":
+            return swiss(self.names, self.seats, self.ratings)
+        return round_robin(self.names, self.seats)
+
+    def record(self, table, result):
+        """
+        Rates the result of a game played at a table.
+        """
+        scores = [p["score"] for p in result["players"]]
+        rate(self.ratings, table, scores)
+        best = max(scores)
+        for (e, score) in zip(table, scores):
+            self.games[e] += 1
+            if score == best:
+                self.wins[e] += 1 / scores.count(best)
+        self.done.append(result["game"])
+
+    def play(self, workers=1, out=None):
+        """
+        Plays the rounds of the tournament left to play, writing the
+        result of every game to out when it is given.
+        """
+        pool = multiprocessing.Pool(workers) if workers > 1 else None
+        try:
+            while self.round < self.rounds:
+                if self.tables is None:
+                    self.tables = self.pairings()
+                    self.done = []
+                    self.save()
+                jobs = [(self.first + i, [self.entries[e] for e in table], self.seed + self.first + i, self.size, False, False)
+                        for (i, table) in enumerate(self.tables) if self.first + i not in self.done]
+                results = pool.imap(play_job, jobs) if pool else map(play_job, jobs)
+                for result in results:
+                    table = self.tables[result["game"] - self.first]
+                    self.record(table, result)
+                    if out is not None:
+                        result["entries"] = table
+                        out.write(json.dumps(result) + "\n")
+                        out.flush()
+                    self.save()
+                self.first += len(self.tables)
+                self.tables = None
+                self.round += 1
+                self.save()
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+    def standings(self):
+        """
+        Returns the entries from the best rated to the worst as
+        (name, rating, games, wins).
+        """
+        return sorted(((e, self.ratings[e], self.games[e], self.wins[e]) for e in self.names),
+                      key=lambda row: -row[1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m simulation.tournament",
+                                     description="Rates configurations of strategies and weights by playing them against each other.")
+    parser.add_argument("--entry", action="append", type=parse_player, default=[],
+                        help="strategy:w1,w2,...[@evaluator.npz][@openings.book] once for every configuration")
+    parser.add_argument("--schedule", choices=("roundrobin", "swiss"), default="roundrobin")
+    parser.add_argument("--seats", type=int, default=4, help="number of players at a table (2 to 4)")
+    parser.add_argument("--rounds", type=int, default=1, help="number of rounds to play")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game")
+    parser.add_argument("--size", type=int, default=20, help="width and height of the board")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--checkpoint", help="file the tournament is saved to, and continued from if it exists")
+    parser.add_argument("--out", help="JSONL file to append the result of every game to")
+    args = parser.parse_args(argv)
+
+    if args.checkpoint and os.path.exists(args.checkpoint):
+        tournament = Tournament.load(args.checkpoint)
+    else:
+        entries = {}
+        for entry in args.entry:
+            entries[player_name(entry)] = entry
+        if not 2 <= args.seats <= 4:
+            parser.error("a table needs between 2 and 4 players")
+        if len(entries) < args.seats:
+            parser.error("a tournament needs at least as many different entries as seats")
+        tournament = Tournament(entries, args.schedule, args.seats, args.rounds,
+                                args.seed, args.size, args.checkpoint)
+
+    out = open(args.out, "a") if args.out else None
+    try:
+        tournament.play(args.workers, out)
+    finally:
+        if out is not None:
+            out.close()
+
+    print(f"{'entry':30} {'rating':>7} {'games':>6} {'wins':>6}")
+    for (e, rating, games, wins) in tournament.standings():
+        print(f"{e:30} {rating:7.1f} {games:6d} {wins:6.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+import argparse
+import os
+import numpy as np
+from objects.blokus import Blokus
+from objects.board import Board
+from objects.evaluator import FEATURES, LinearEvaluator, MLPEvaluator, features, save
+from objects.player import Player, layout
+from objects.shape_map import ORIENTATIONS
+from objects.record import OFFSETS
+from objects.state import SHAPE_IDS
+from .dataset import LABELS, PIECE_IDS, Dataset, planes
+
+
+# Training fits an evaluator (see objects/evaluator.py) to self-play data
+# (see dataset.py). Every row is turned back into the position it was taken
+# from, and the features of the placement chosen there are computed with the
+# same function the evaluator uses during a game. The evaluator learns to
+# predict the share of the win that the player who chose the placement went
+# on to get, so placements like those of the winners score higher.
+#
+# The linear evaluator is fitted exactly by ridge regression, the MLP by
+# minibatch gradient descent with Adam. The last tenth of the rows is kept
+# out of the fit to report how well the evaluator predicts unseen games.
+#
+#     python -m simulation.train --data data --kind mlp --out mlp.npz
+#     python -m simulation --player greedy:1@mlp.npz --player greedy:2,1 ...
+
+
+def position(row, cells, size):
+    """
+    Returns the game of the position of a row, with the player to move first,
+    from the row and the (4, n, m) array of its planes.
+    """
+    board = Board(size[0], size[1], "_")
+    mover = int(row["mover"])
+    order = LABELS[mover:] + LABELS[:mover]
+
+    players = []
+    history = []
+    for (j, label) in enumerate(order):
+        left = [PIECE_IDS[k] for k in np.nonzero(row["pieces"][j])[0]]
+        (ys, xs) = np.nonzero(cells[j])
+        if not left and not len(ys):
+            # no player sat here
+            continue
+        player = Player(label, label, None, [])
+        player.pieces = [SHAPE_IDS[ID]() for ID in left]
+        if row["starts"][j] >= 0:
+            player.corners = set([divmod(int(row["starts"][j]), size[1])[::-1]])
+        players.append(player)
+        if len(ys):
+            history.append((label, board.mask(list(zip(xs.tolist(), ys.tolist())))))
+    board.load(history, 0)
+
+    game = Blokus(players, board, [shape() for shape in SHAPE_IDS.values()])
+    game.rounds = len(players)
+    return game
+
+
+def chosen(row, size):
+    """
+    Returns the points and corners of the placement chosen in a row.
+    """
+    (y, x) = divmod(int(row["cell"]), size[1])
+    orientation = ORIENTATIONS[row["orientation"]]
+    x0 = min(i for (i, j) in orientation.points)
+    y0 = min(j for (i, j) in orientation.points)
+    points = [(x + i, y + j) for (i, j) in OFFSETS[row["orientation"]]]
+    corners = [(x + i - x0, y + j - y0) for (i, j) in orientation.corners]
+    return points, corners
+
+
+def row_features(rows, size):
+    """
+    Returns the (rows, len(FEATURES)) array of the features of the placements
+    chosen in rows.
+    """
+    table = np.empty((len(rows), len(FEATURES)))
+    all_cells = planes(rows, size)
+    for (k, row) in enumerate(rows):
+        game = position(row, all_cells[k], size)
+        (points, corners) = chosen(row, size)
+        table[k] = features(layout([points], size), layout([corners], size), game.players[0], game)[0]
+    return table
+
+
+def shard_features(args):
+    (directory, entry) = args
+    dataset = Dataset(directory)
+    rows = dataset.shard(entry)
+    return row_features(rows, dataset.size), np.array(rows["outcome"], dtype=float)
+
+
+def load_features(directory, workers=1):
+    """
+    Returns the features and outcomes of every row of a dataset.
+    """
+    dataset = Dataset(directory)
+    jobs = [(directory, entry) for entry in dataset.shards]
+    if workers > 1:
+        import multiprocessing
+
+        with multiprocessing.Pool(workers) as pool:
+            parts = pool.map(shard_features, jobs)
+    else:
+        parts = list(map(shard_features, jobs))
+    return np.concatenate([x for (x, y) in parts]), np.concatenate([y for (x, y) in parts])
+
+
+def standardize(x):
+    mean = x.mean(axis=0)
+    scale = x.std(axis=0)
+    scale[scale == 0] = 1
+    return mean, scale
+
+
+def fit_linear(x, y, ridge=1e-3):
+    """
+    Returns the LinearEvaluator fitted to x and y by ridge regression.
+    """
+    (mean, scale) = standardize(x)
+    z = np.hstack([(x - mean) / scale, np.ones((len(x), 1))])
+    penalty = ridge * len(x) * np.eye(z.shape[1])
+    penalty[-1, -1] = 0
+    solution = np.linalg.solve(z.T @ z + penalty, z.T @ y)
+    return LinearEvaluator(mean, scale, solution[:-1], solution[-1])
+
+
+def fit_mlp(x, y, hidden=16, epochs=20, batch=256, rate=3e-3, seed=0):
+    """
+    Returns the MLPEvaluator fitted to x and y by minibatch gradient
+    descent on the mean squared error, with Adam.
+    """
+    rng = np.random.default_rng(seed)
+    (mean, scale) = standardize(x)
+    z = (x - mean) / scale
+    params = {
+        "w1": rng.standard_normal((z.shape[1], hidden)) * np.sqrt(2 / z.shape[1]),
+        "b1": np.zeros(hidden),
+        "w2": rng.standard_normal(hidden) * np.sqrt(1 / hidden),
+        "b2": np.array(y.mean()),
+    }
+    moments = {key: (np.zeros_like(value), np.zeros_like(value)) for (key, value) in params.items()}
+    step = 0
+    for epoch in range(epochs):
+        order = rng.permutation(len(z))
+        for start in range(0, len(z), batch):
+            chunk = order[start:start + batch]
+            (zb, yb) = (z[chunk], y[chunk])
+            pre = zb @ params["w1"] + params["b1"]
+            hid = np.maximum(pre, 0)
+            error = (hid @ params["w2"] + params["b2"] - yb) * 2 / len(zb)
+            back = np.outer(error, params["w2"]) * (pre > 0)
+            grads = {"w1": zb.T @ back, "b1": back.sum(axis=0), "w2": hid.T @ error, "b2": error.sum()}
+            step += 1
+            for key in params:
+                (m, v) = moments[key]
+                m = 0.9 * m + 0.1 * grads[key]
+                v = 0.999 * v + 0.001 * grads[key] ** 2
+                moments[key] = (m, v)
+                params[key] = params[key] - rate * (m / (1 - 0.9 ** step)) / (np.sqrt(v / (1 - 0.999 ** step)) + 1e-8)
+    return MLPEvaluator(mean, scale, params["w1"], params["b1"], params["w2"], params["b2"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m simulation.train",
+                                     description="Fits an evaluator of placements to self-play data.")
+    parser.add_argument("--data", required=True, help="directory of the dataset")
+    parser.add_argument("--kind", choices=("linear", "mlp"), default="linear")
+    parser.add_argument("--hidden", type=int, default=16, help="hidden units of the MLP")
+    parser.add_argument("--epochs", type=int, default=20, help="passes over the data to fit the MLP")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--out", required=True, help=".npz file to write the evaluator to")
+    args = parser.parse_args(argv)
+
+    (x, y) = load_features(args.data, args.workers)
+    split = max(1, int(len(x) * 0.9))
+    if args.kind == "linear":
+        evaluator = fit_linear(x[:split], y[:split])
+    else:
+        evaluator = fit_mlp(x[:split], y[:split], args.hidden, args.epochs, seed=args.seed)
+    save(evaluator, args.out)
+
+    for (name, (xs, ys)) in (("fit", (x[:split], y[:split])), ("held out", (x[split:], y[split:]))):
+        if len(xs):
+            error = np.mean((evaluator.predict(xs) - ys) ** 2)
+            print(f"{name}: {len(xs)} rows, mean squared error {error:.4f} (variance {ys.var():.4f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+import math
+import time
+from objects.territory import track
+from objects.zobrist import TranspositionTable
+from strategies.search import Search, Timeout
+
+# Here we implement an exact endgame solver. Late in a game every player has
+# few pieces and few anchors left, so the whole rest of the game can be
+# searched: every placement of every player, down to the position where no
+# player can place a piece. The solver plays it as the paranoid search does,
+# assuming that every opponent plays against the searching player, which is
+# exact for two players and the best result the player can guarantee for more.
+#
+# The objective is either the player's final score ("score") or its margin
+# over the best of its opponents ("margin"). Placements are ordered by their
+# eval_move score with ORDERING as weights, the best placement found for a
+# position before first, and every position solved is kept in a transposition
+# table, along with whether its value is exact or only a bound. Placements
+# commute, so the table saves most of the work.
+#
+# The board tracks its territory (see objects/territory.py) during a solve.
+# Once no other player can reach an empty cell that a player can reach, the
+# player is isolated: its placements cannot change what any other player can
+# do, nor theirs what it can do. It then drops out of the search, passing its
+# turns, and the best score it can add placing its pieces alone is added to
+# its score at the end. That search is far cheaper than searching it in turn
+# with the others, and it is kept by the cells the player can reach, which
+# the other players' placements leave alone.
+#
+# A solve gives up once it runs past its time limit, and the strategy then
+# plays as it would have. The solver only switches on once the number of
+# legal placements left to all players, counted by placements_left, is at
+# most a given threshold. The player keeps the number of placements left
+# when its solve gave up (player.unsolved), and the solve is only tried
+# again once fewer than RETRY times as many are left, so a strategy does
+# not spend its whole time limit on a failed solve every move.
+
+ORDERING = [1, 1]
+OBJECTIVES = ("score", "margin")
+SECONDS = 10
+RETRY = 0.75
+# Transposition tables kept from one move to the next, by player and objective.
+TABLES = {}
+
+
+def placements_left(game):
+    """
+    Returns the number of legal placements of every player that can still move.
+    """
+    return sum(len(p.possible_moves(p.pieces, game)) for p in game.players if not p.finished)
+
+
+class Endgame(Search):
+    """
+    An exact search of the rest of the game for the given objective,
+    "score" or "margin", within the given number of seconds (if any).
+    """
+
+    def __init__(self, objective="margin", table=None, seconds=SECONDS):
+        assert (objective in OBJECTIVES)
+        Search.__init__(self, ORDERING, 0, 0, "paranoid", table, 1, seconds)
+        self.objective = objective
+        # the best score an isolated player can add, by its territory
+        self.alone_scores = {}
+
+    def solve(self, player, game):
+        """
+        Returns the best placement (Shape object) for the player, or None if
+        it cannot place any piece, and the value of the game for the player
+        with it. Raises Timeout when the solve runs past its time limit.
+        """
+        self.start(player, game)
+        self.deadline = time.perf_counter() + self.seconds if self.seconds else None
+        previous = game.board.territory
+        track(game)
+        try:
+            return self.solve_root(player)
+        finally:
+            game.board.territory = previous
+
+    def solve_root(self, player):
+        key = self.game.board.state_key(player.label)
+        entry = self.table.probe(key)
+        moves = self.ordered(player, entry[4] if entry is not None else None)
+        if not moves:
+            # the others play on to the end without the player
+            self.game.rounds += 1
+            try:
+                return None, self.solved(1, 1, -math.inf, math.inf)
+            finally:
+                self.game.rounds -= 1
+
+        (alpha, best) = (-math.inf, None)
+        for (piece, score) in moves:
+            self.play(player, piece)
+            try:
+                value = self.solved(1, 0, alpha, math.inf)
+            finally:
+                self.take_back(player)
+            if value > alpha:
+                (alpha, best) = (value, piece)
+        self.table.store(key, 0, alpha, TranspositionTable.EXACT, best.points)
+        return best, alpha
+
+    def value(self, scores=None):
+        """
+        Returns the objective of the searching player in the position, or
+        with the given final scores of the players in search order.
+        """
+        scores = scores or [p.score for p in self.order]
+        if self.objective == "score":
+            return scores[0]
+        return scores[0] - max(scores[1:] or [0])
+
+    def solved(self, turn, passes, alpha, beta):
+        """
+        Returns the value of the position for the searching player, played
+        to the end with alpha-beta pruning. turn is the number of placements
+        since the root and passes the number of players in a row that could
+        not move.
+        """
+        isolated = self.game.board.territory.isolated()
+        if passes == len(self.order) or len(isolated) == len(self.order):
+            return self.value([p.score + self.alone(p) for p in self.order])
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise Timeout()
+
+        mover = self.order[turn % len(self.order)]
+        if mover.label in isolated:
+            # it places its pieces alone once the game is over
+            return self.passed(turn, passes, alpha, beta)
+        key = self.game.board.state_key(mover.label)
+        entry = self.table.probe(key)
+        first = None
+        if entry is not None:
+            (_, _, stored, flag, first, _) = entry
+            if flag == TranspositionTable.EXACT:
+                return stored
+            if flag == TranspositionTable.LOWER:
+                alpha = max(alpha, stored)
+            else:
+                beta = min(beta, stored)
+            if alpha >= beta:
+                return stored
+
+        moves = self.ordered(mover, first)
+        if not moves:
+            # a player that cannot move now never will, so the table is
+            # left to the positions where someone places a piece
+            return self.passed(turn, passes, alpha, beta)
+
+        maximizing = (mover is self.order[0])
+        (alpha_0, beta_0) = (alpha, beta)
+        value = -math.inf if maximizing else math.inf
+        best = None
+        for (piece, score) in moves:
+            self.play(mover, piece)
+            try:
+                child = self.solved(turn + 1, 0, alpha, beta)
+            finally:
+                self.take_back(mover)
+            if maximizing and child > value:
+                (value, best) = (child, piece)
+                alpha = max(alpha, value)
+            elif not maximizing and child < value:
+                (value, best) = (child, piece)
+                beta = min(beta, value)
+            if alpha >= beta:
+                break
+
+        if value <= alpha_0:
+            flag = TranspositionTable.UPPER
+        elif value >= beta_0:
+            flag = TranspositionTable.LOWER
+        else:
+            flag = TranspositionTable.EXACT
+        self.table.store(key, 0, value, flag, best.points)
+        return value
+
+    def passed(self, turn, passes, alpha, beta):
+        """
+        Returns the value of the position after the player to move passes.
+        """
+        self.game.rounds += 1
+        try:
+            return self.solved(turn + 1, passes + 1, alpha, beta)
+        finally:
+            self.game.rounds -= 1
+
+    def alone(self, player):
+        """
+        Returns the most the player can add to its score by placing pieces
+        with no other player moving, for a player that is isolated or
+        cannot move.
+        """
+        territory = self.game.board.territory
+        # every placement left to the player covers cells of its reach and
+        # an anchor, whatever else is on the board
+        key = (player.label, territory.reach.get(player.label, 0), territory.seeds(player.label),
+               tuple(sorted(piece.ID for piece in player.pieces)))
+        if key in self.alone_scores:
+            return self.alone_scores[key]
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise Timeout()
+        # no more than the squares of its pieces, or the cells it can reach
+        bound = min(sum(piece.size for piece in player.pieces), bin(key[1]).count("1"))
+        best = 0
+        for (piece, score) in self.ordered(player):
+            if best >= bound:
+                break
+            self.play(player, piece)
+            try:
+                best = max(best, piece.size + self.alone(player))
+            finally:
+                self.take_back(player)
+        self.alone_scores[key] = best
+        return best
+
+
+def solve(player, game, objective="margin", seconds=SECONDS):
+    """
+    Returns the best placement for the player and the value of the game for
+    it with that placement, solved exactly, or None if the solve ran out of
+    time.
+    """
+    table = TABLES.setdefault((player.label, objective), TranspositionTable())
+    endgame = Endgame(objective, table, seconds)
+    try:
+        with game.metrics.timer("endgame.calculation"):
+            result = endgame.solve(player, game)
+    except Timeout:
+        game.metrics.count("endgame.timeouts")
+        return None
+    finally:
+        game.metrics.count("endgame.nodes", endgame.nodes)
+    game.metrics.count("endgame.solved")
+    return result
+
+
+def endgame_move(player, game, threshold, seconds=None):
+    """
+    Returns the placement that solves the rest of the game for the player,
+    if at most threshold legal placements are left to all players, within
+    the given number of seconds (SECONDS if none), or None to let the
+    strategy choose instead.
+    """
+    if not threshold:
+        return None
+    left = placements_left(game)
+    if left > threshold or (player.unsolved is not None and left >= RETRY * player.unsolved):
+        return None
+    result = solve(player, game, "margin", seconds or SECONDS)
+    if result is None:
+        player.unsolved = left
+        return None
+    return result[0]
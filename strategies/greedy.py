@@ -1,5 +1,7 @@
-import time
-from objects.player import Player, eval_move
+from objects.book import book_move
+from objects.moves import MoveCache
+from objects.player import Player, eval_moves
+from strategies.endgame import endgame_move
 
 
 class Greedy(Player):
@@ -17,6 +19,12 @@ class Greedy(Player):
         self.strategy = strategy
         self.score = 0
         self.weights = weights
+        self.journal = []
+        self.moves = MoveCache()
+        self.finished = False
+        self.evaluator = None
+        self.book = None
+        self.unsolved = None
 
     def do_move(self, game):
         """
@@ -32,6 +40,11 @@ class Greedy(Player):
 
 # weights[0] determines how important size of a piece is
 # weights[1] determines how important maximizing the difference of my corners and opponent corners
+# weights[2] (optional) decides below how many legal placements left to all players the rest of
+# the game is solved exactly (see endgame.py, 0 never)
+# weights[3] (optional) decides how many seconds that solve may take (0 for endgame.py's SECONDS)
+# (a player given an Evaluator as player.evaluator is scored by it instead,
+# and a player given an opening book as player.book plays from it while it can)
 
 def greedy_player(player, game, weights):
     """
@@ -40,6 +53,14 @@ def greedy_player(player, game, weights):
     If no placement can be made, function should return None.
     """
 
+    # a placement from the player's opening book needs no calculation
+    booked = book_move(player, game)
+    if booked is not None:
+        return booked
+    solved = endgame_move(player, game, weights[2] if len(weights) > 2 else 0, weights[3] if len(weights) > 3 else 0)
+    if solved is not None:
+        return solved
+
     # create copy of player's pieces (no destructively altering player's pieces)
     shape_options = [p for p in player.pieces]
     board = game.board
@@ -48,40 +69,21 @@ def greedy_player(player, game, weights):
         """
         Returns the greediest move.
         """
-        # create an empty list that will contain all the possible moves with their respective scores
-        final_moves = []
-        tic = time.perf_counter()
-        # for each piece, calculate all possible placements, and for each placement, calculate the score
-        # of the move; add (move, score) to the list of final moves
-        for piece in shape_options:
-            # calculate all possible placements for the current piece
-            possibles = player.possible_moves([piece], game)
-            # if there are possible placements for the current piece:
-            if possibles:
-                def map_eval(piece):
-                    return eval_move(piece, player, game, weights)
-
-                # calculate score for each move and store it in a temporary list
-                tmp = list(map(map_eval, possibles))
-                # add all the elements in the temporary list in the final moves lsit
-                final_moves.extend(tmp)
-            # if there are no possible placements for the current piece:
-            else:
-                # remove the piece from the list of pieces
-                shape_options.remove(piece)
-
-        toc = time.perf_counter()
-        print(f"Greedy calculation: {toc - tic} seconds")
+        with game.metrics.timer("greedy.calculation"):
+            # calculate all possible placements of every piece
+            possibles = player.possible_moves(shape_options, game)
+            # calculate the score of every placement at once, as a list of (move, score)
+            final_moves = eval_moves(possibles, player, game, weights, player.evaluator)
 
         # create score list that contains all Piece placements, sorted by their score
         by_score = sorted(final_moves, key=lambda move: move[1], reverse=True)
         # if the score list contains Piece placements (objects), return the highest scoring Piece placement
         if len(by_score) > 0:
-            print(f"placed piece {by_score[0][0].ID} at {by_score[0][0].refpt}")
+            game.metrics.event("placed", piece=by_score[0][0].ID, at=by_score[0][0].refpt)
             return by_score[0][0]
         # else, return None (no Piece placement)
         else:
-            print("out of moves")
+            game.metrics.event("out_of_moves", player=player.name)
             return None
 
     # while there are shapes to place down, perform a greedy move
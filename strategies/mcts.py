@@ -0,0 +1,385 @@
+import math
+import multiprocessing
+import random
+import time
+from objects.book import book_move
+from objects.player import eval_moves
+from objects.shape_map import get_orientations
+from objects.state import pack, unpack, warm
+
+# weights[0] decides how many playouts are run per move
+# weights[1] decides how many seconds a move may take (0 for no limit)
+# weights[2] decides how many worker processes run the playouts (1 runs them in this process)
+# weights[3] (optional) decides how much UCT explores placements that have been visited little
+# weights[4] (optional) decides how many placements a playout makes before the game is scored
+# weights[5] and weights[6] (optional, together) are the eval_move weights of size and corners
+# that order the placements of a node before they are expanded
+# (a player given an opening book as player.book plays from it while it can)
+
+EXPLORATION = 1.4
+PLAYOUT_DEPTH = 20
+# a node may have ceil(WIDENING * sqrt(visits)) children, so the best placements
+# by eval_move, with PRIOR as weights, are expanded first and the rest only once
+# the node is well visited
+WIDENING = 2
+PRIOR = [2, 1]
+
+# Pools of worker processes, by number of workers, kept from one move to the next.
+POOLS = {}
+
+
+# Here we implement Monte Carlo Tree Search with UCT. Every iteration walks
+# down the tree choosing the placement with the best upper confidence bound
+# for the player to move, expands one new placement, plays a fast random
+# playout from there and backs the result up the path. A playout is scored
+# by who is ahead once it ends: a win is worth 1, shared between the players
+# tied for the lead.
+#
+# Moves are played on the game's own board and players with apply and undo.
+# The playouts can be spread over a pool of worker processes in two ways:
+#
+# - root parallelism (mcts_player): every worker grows its own tree from the
+#   packed state of the game, and the visits of the root placements are summed.
+# - leaf parallelism (mcts_leaf_player): one tree is grown here, and every
+#   new leaf is scored by one playout in each worker.
+
+class Node:
+    """
+    A node of the search tree, reached by the placement piece (a Shape
+    object, or None for a pass) of the player with the given index in
+    the search order.
+    """
+
+    def __init__(self, parent, piece, mover):
+        self.parent = parent
+        self.piece = piece
+        self.mover = mover
+        self.children = []
+        # (piece, score) of the placements not expanded yet, best last
+        self.untried = None
+        self.visits = 0
+        # total reward of the mover over the playouts through the node
+        self.reward = 0.0
+
+
+class MCTS:
+    """
+    A Monte Carlo tree search for the player in the game.
+    """
+
+    def __init__(self, player, game, weights, exploration, playout_depth, rng):
+        self.game = game
+        self.weights = weights
+        self.exploration = exploration
+        self.playout_depth = playout_depth
+        self.rng = rng
+        self.prior = list(weights[5:7]) if len(weights) > 6 else PRIOR
+        # the players in the order they will move, starting with the player
+        start = [p.label for p in game.players].index(player.label)
+        self.order = game.players[start:] + game.players[:start]
+        self.root = Node(None, None, None)
+        self.playouts = 0
+
+    def run(self, iterations, deadline=None, rollout=None):
+        """
+        Grows the tree for a number of iterations, or until the deadline
+        (a time.perf_counter value) has passed. rollout, if given, replaces
+        the playout of a new leaf; it takes the number of placements since
+        the root and of passes in a row, and returns the rewards.
+        """
+        for i in range(iterations):
+            if deadline is not None and time.perf_counter() > deadline:
+                break
+            self.iterate(rollout or self.playout)
+
+    def iterate(self, rollout):
+        """
+        Runs one selection, expansion, playout and backup.
+        """
+        node = self.root
+        turn = 0
+        passes = 0
+
+        # selection: follow the best child while the node may not be widened
+        while node.children and not self.widens(node):
+            node = self.select(node)
+            passes = passes + 1 if node.piece is None else 0
+            self.play(turn, node.piece)
+            turn += 1
+
+        # expansion: add the next best untried placement, or a pass
+        if passes < len(self.order):
+            if node.untried is None:
+                node.untried = self.candidates(turn)
+            if node.untried:
+                (piece, score) = node.untried.pop()
+                child = Node(node, piece, turn % len(self.order))
+                node.children.append(child)
+                node = child
+                passes = passes + 1 if piece is None else 0
+                self.play(turn, piece)
+                turn += 1
+
+        rewards = rollout(turn, passes)
+
+        # take the path back and update its nodes
+        while node is not self.root:
+            turn -= 1
+            self.take_back(turn, node.piece)
+            node.visits += 1
+            node.reward += rewards[node.mover]
+            node = node.parent
+        self.root.visits += 1
+
+    def widens(self, node):
+        """
+        Returns whether a new child should be expanded at the node.
+        """
+        if node.untried is not None and not node.untried:
+            return False
+        return len(node.children) < math.ceil(WIDENING * math.sqrt(node.visits + 1))
+
+    def select(self, node):
+        """
+        Returns the child of the node with the best upper confidence bound.
+        """
+        log_visits = math.log(node.visits + 1)
+
+        def bound(child):
+            if child.visits == 0:
+                return math.inf
+            return child.reward / child.visits + self.exploration * math.sqrt(log_visits / child.visits)
+
+        return max(node.children, key=bound)
+
+    def candidates(self, turn):
+        """
+        Returns the placements of the player to move as (piece, score)
+        tuples sorted by their eval_move score with the prior weights,
+        best last, or a single
+        pass if the player cannot place any piece.
+        """
+        mover = self.order[turn % len(self.order)]
+        possibles = [] if mover.finished else mover.possible_moves(mover.pieces, self.game)
+        if not possibles:
+            return [(None, 0)]
+        by_score = eval_moves(possibles, mover, self.game, self.prior)
+        return sorted(by_score, key=lambda move: move[1])
+
+    def play(self, turn, piece):
+        """
+        Places a piece (or passes, if piece is None) for the player
+        to move and moves the game on a turn.
+        """
+        if piece is not None:
+            mover = self.order[turn % len(self.order)]
+            self.game.board.apply(mover, piece)
+            mover.apply(piece, self.game.board)
+        self.game.rounds += 1
+
+    def take_back(self, turn, piece):
+        """
+        Takes back the placement (or pass) made by play on the given turn.
+        """
+        self.game.rounds -= 1
+        if piece is not None:
+            mover = self.order[turn % len(self.order)]
+            mover.undo()
+            self.game.board.undo()
+
+    def random_move(self, player):
+        """
+        Returns a random placement of the player, or None: the first valid
+        one found trying corners, pieces and orientations in random order.
+        """
+        board = self.game.board
+        corners = player.free_corners(board)
+        pieces = list(player.pieces)
+        self.rng.shuffle(corners)
+        for cr in corners:
+            self.rng.shuffle(pieces)
+            for sh in pieces:
+                orientations = list(get_orientations(sh))
+                self.rng.shuffle(orientations)
+                for orientation in orientations:
+                    num = self.rng.randrange(orientation.size)
+                    for k in range(orientation.size):
+                        index = (num + k) % orientation.size
+                        mask = board.placement_mask(orientation, cr, index)
+                        if mask is not None and self.game.valid_mask(player, mask):
+                            return sh.place(orientation, cr, index)
+        return None
+
+    def playout(self, turn, passes):
+        """
+        Plays random placements from the current position until every
+        player has passed in a row or the playout depth is reached, and
+        returns the rewards of the players in search order.
+        """
+        played = []
+        for step in range(self.playout_depth):
+            if passes == len(self.order):
+                break
+            mover = self.order[(turn + step) % len(self.order)]
+            piece = None if mover.finished else self.random_move(mover)
+            passes = passes + 1 if piece is None else 0
+            self.play(turn + step, piece)
+            played.append(piece)
+
+        rewards = self.rewards()
+        for step in reversed(range(len(played))):
+            self.take_back(turn + step, played[step])
+        self.playouts += 1
+        return rewards
+
+    def rewards(self):
+        """
+        Returns 1 shared between the players with the highest score,
+        and 0 for every other player, in search order.
+        """
+        scores = [p.score for p in self.order]
+        leaders = [i for i in range(len(scores)) if scores[i] == max(scores)]
+        return [1.0 / len(leaders) if i in leaders else 0.0 for i in range(len(scores))]
+
+
+def settings(weights):
+    """
+    Returns the number of iterations, seconds, workers, exploration
+    constant and playout depth set by the weights.
+    """
+    exploration = weights[3] if len(weights) > 3 else EXPLORATION
+    playout_depth = weights[4] if len(weights) > 4 else PLAYOUT_DEPTH
+    return weights[0], weights[1], weights[2], exploration, playout_depth
+
+
+def get_pool(workers):
+    """
+    Returns a pool of the given number of worker processes.
+    """
+    if workers not in POOLS:
+        POOLS[workers] = multiprocessing.Pool(workers)
+    return POOLS[workers]
+
+
+def grow(args):
+    """
+    Grows a tree from the packed state of a game in a worker process.
+    """
+    (state, label, weights, seed) = args
+    game = unpack(state)
+    warm(game)
+    return root_visits(game, label, weights, seed)
+
+
+def root_visits(game, label, weights, seed):
+    """
+    Grows a tree for the player with the given label and returns the
+    points, visits and rewards of the placements at its root.
+    """
+    (iterations, seconds, workers, exploration, playout_depth) = settings(weights)
+    player = [p for p in game.players if p.label == label][0]
+    tree = MCTS(player, game, weights, exploration, playout_depth, random.Random(seed))
+    tree.run(iterations, time.perf_counter() + seconds if seconds else None)
+    return [(tuple(child.piece.points), child.visits, child.reward)
+            for child in tree.root.children if child.piece is not None]
+
+
+def rollout(args):
+    """
+    Plays one random playout from the packed state of a position in a worker process.
+    """
+    (state, label, weights, turn, passes, seed) = args
+    # a playout draws random placements without the move caches, so they are left cold
+    game = unpack(state)
+    (iterations, seconds, workers, exploration, playout_depth) = settings(weights)
+    player = [p for p in game.players if p.label == label][0]
+    tree = MCTS(player, game, weights, exploration, playout_depth, random.Random(seed))
+    return tree.playout(turn, passes)
+
+
+def best_candidate(player, game, weights):
+    """
+    Returns the placement of the player a tree would expand first.
+    """
+    (iterations, seconds, workers, exploration, playout_depth) = settings(weights)
+    tree = MCTS(player, game, weights, exploration, playout_depth, random.Random(0))
+    return tree.candidates(0)[-1][0]
+
+
+def mcts_player(player, game, weights):
+    """
+    Takes in a Player object and Game object and returns the placement visited
+    most by Monte Carlo tree searches run in parallel from copies of the game
+    (root parallelism). If no placement can be made, function should return None.
+    """
+    booked = book_move(player, game)
+    if booked is not None:
+        return booked
+
+    (iterations, seconds, workers, exploration, playout_depth) = settings(weights)
+    possibles = player.possible_moves(player.pieces, game)
+    if not possibles:
+        return None
+
+    tic = time.perf_counter()
+    if workers > 1:
+        # every worker runs its share of the iterations, on its own seed
+        share = weights[:]
+        share[0] = int(math.ceil(iterations / float(workers)))
+        state = pack(game)
+        jobs = [(state, player.label, share, random.getrandbits(32)) for i in range(workers)]
+        results = get_pool(workers).map(grow, jobs)
+    else:
+        results = [root_visits(game, player.label, weights, random.getrandbits(32))]
+
+    visits = {}
+    for result in results:
+        for (points, count, reward) in result:
+            visits[points] = visits.get(points, 0) + count
+    game.metrics.time("mcts.calculation", time.perf_counter() - tic)
+    game.metrics.count("mcts.playouts", sum(visits.values()))
+
+    if not visits:
+        # no placement was tried before the time ran out
+        return best_candidate(player, game, weights)
+    best = max(visits, key=visits.get)
+    return [piece for piece in possibles if tuple(piece.points) == best][0]
+
+
+def mcts_leaf_player(player, game, weights):
+    """
+    Takes in a Player object and Game object and returns the placement visited
+    most by a Monte Carlo tree search that scores every new leaf with playouts
+    run in parallel (leaf parallelism). If no placement can be made, function
+    should return None.
+    """
+    booked = book_move(player, game)
+    if booked is not None:
+        return booked
+
+    (iterations, seconds, workers, exploration, playout_depth) = settings(weights)
+    if not player.possible_moves(player.pieces, game):
+        return None
+
+    tree = MCTS(player, game, weights, exploration, playout_depth, random.Random(random.getrandbits(32)))
+
+    def parallel_playout(turn, passes):
+        """
+        Scores a leaf by the mean rewards of one playout in each worker.
+        """
+        if workers <= 1:
+            return tree.playout(turn, passes)
+        state = pack(game)
+        jobs = [(state, player.label, weights, turn, passes, tree.rng.getrandbits(32)) for i in range(workers)]
+        results = get_pool(workers).map(rollout, jobs)
+        tree.playouts += len(results)
+        return [sum(rewards) / len(results) for rewards in zip(*results)]
+
+    with game.metrics.timer("mcts.calculation"):
+        tree.run(iterations, time.perf_counter() + seconds if seconds else None, parallel_playout)
+    game.metrics.count("mcts.playouts", tree.playouts)
+
+    children = [child for child in tree.root.children if child.piece is not None]
+    if not children:
+        return best_candidate(player, game, weights)
+    return max(children, key=lambda child: child.visits).piece
@@ -1,149 +1,97 @@
-import copy
 import time
-from objects.player import eval_move
+from objects.book import book_move
+from objects.zobrist import TranspositionTable
+from strategies.endgame import endgame_move
+from strategies.search import Search
 
 # weights[0] determines how important size of a piece is
 # weights[1] determines how important maximizing the difference of my corners and opponent corners
 # weights[2] decides how many of the best placements we choose to look ahead with
-# weights[3] decides how important the score of the second move is
+# weights[3] decides how important the searched value of a placement is
 # weights[4] decides how important the score of the first move is
+# weights[5] (optional) decides how many placements deep we search, counting every player
+# weights[6] (optional) decides how many of the best placements we search below the first move
+# weights[7] (optional) decides how many worker processes search the best placements
+# weights[8] (optional) decides how many seconds a move may take (0 for no limit)
+# weights[9] (optional) decides below how many legal placements left to all players the rest of
+# the game is solved exactly (see endgame.py, 0 never), within the weights[8] seconds of the move
+# if given: the search only has the time the solve left
+# (a player given an opening book as player.book plays from it while it can)
+
+# By default we look as far ahead as one placement by every opponent
+# followed by a second placement of our own.
+DEPTH = 5
+WIDTH = 2
+
+# Transposition tables kept from one move to the next, by player and mode, with
+# the weights and evaluator they were filled with, since the values stored
+# depend on both. A table is replaced when they change, so trying many weights
+# (as the optimizer does) never keeps more than one table per player and mode.
+TABLES = {}
 
 
 def minimax_player(player, game, weights):
-    # takes in a player and a board, and updates the player's corners depending on the state of the board
-    def check_corners(player, board):
-        """
-        Updates the corners of the player in the test board (copy), in case the
-        corners have been covered by another player's pieces.
-        """
-        player.corners = set([(i, j) for (i, j) in player.corners if board.state[j][i] == game.board.null])
-
-    # create a copy of the player's pieces
-    shape_options = [p for p in player.pieces]
-    # determine all possible moves
-    possibles = player.possible_moves(shape_options, game)
-    final_choices = []
-    # if there are possible moves:
-    if possibles:
-        # function for evaluating moves (for mapping purposes)
-        def eval_map(piece):
-            return eval_move(piece, player, game, weights)
-
-        # evaluate every possible move
-        candidate_moves = list(map(eval_map, possibles))
-        # create list of tuples (piece, score), sorted by score
-        by_score = sorted(candidate_moves, key=lambda move: move[1], reverse=True)
-
-        # take at most the n highest scoring moves
-        if len(by_score) > weights[2]:
-            top_choices = by_score[:weights[2]]
-        else:
-            top_choices = by_score
-
-        tic = time.perf_counter()
-        for (piece, score) in top_choices:
-            # create a copy of the game
-            game_copy = copy.deepcopy(game)
-            # get board from the game copy (we will be playing on this board)
-            board = game_copy.board
-            # create a copy of the players in the game
-            test_players = copy.deepcopy(game.players)
-            # create a list of the opponents in the game
-            opponents = [opponent for opponent in test_players if opponent.label != player.label]
-            # create a copy of the player currently playing
-            test_player = copy.deepcopy(player)
-            # update the copy of the board with the Piece placement
-            board.update(test_player, piece.points)
-            # update the current player (update corners) with the current Piece placement
-            test_player.update_player(piece, board)
-
-            # update the corners for all opponents
-            def check_cor_map(opponent):
-                return check_corners(opponent, board)
-
-            list(map(check_cor_map, opponents))
-
-            # create a copy of the pieces that the current player has
-            piece_copies = copy.deepcopy(shape_options)
-            # remove the Piece that was just placed on the board
-            piece_copies = [p for p in piece_copies if p.ID != piece.ID]
-
-            # OPPONENTS' TURN TO PLACE PIECE
-
-            # for each opponent:
-            for opponent in opponents:
-                # create a list of tuples (size, piece) for the opponent, sorted by size
-                by_size_op = sorted([(shape.size, shape) for shape in opponent.pieces], key=lambda tup: tup[0], reverse=True)
-                # extract pieces from by_size_op list
-                by_size_op_pieces = [piece_by_size[1] for piece_by_size in by_size_op]
-                # create a list of all the opponent's possible moves
-                possibles_op = opponent.possible_moves(by_size_op_pieces, game_copy)
-                # if there are possible moves left:
-                if possibles_op:
-                    # create an empty list to store evaluations of possible moves
-                    final_moves_op = []
-                    # evaluate every possible move; store in final_moves_op
-                    for poss in possibles_op:
-                        final_moves_op.append(eval_move(poss, opponent, game_copy, weights))
-                    # create list of tuples (piece, score), sorted by score
-                    by_score_op = sorted(final_moves_op, key=lambda move: move[1], reverse=True)
-                    # take the highest scoring move
-                    best_move = by_score_op[0][0]
-                    # update the board with the highest scoring move
-                    board.update(opponent, best_move.points)
-                    # create a list of the other opponents
-                    # other_opponents = [enemy for enemy in game_copy.players if enemy.label != opponent.label]
-                    # update the corners of the other opponents
-                    list(map(check_cor_map, test_players))
-                # if there are no possible moves left for the opponent, return the piece
-                else:
-                    return piece
-
-            # BOARD HAS BEEN UPDATED; OPPONENTS HAVE FINISHED THEIR TURNS
-
-            # create list of all possible moves
-            possibles_2 = test_player.possible_moves(piece_copies, game_copy)
-            # if there are possible moves left:
-            if possibles_2:
-                final_moves_2 = []
-                # evaluate each move; append to list of tuples (piece, score)
-                for possible in possibles_2:
-                    final_moves_2.append(eval_move(possible, test_player, game_copy, weights))
-                # create a list of tuples (piece, score), sorted by score
-                by_score_2 = sorted(final_moves_2, key=lambda move: move[1], reverse=True)
-                # calculate the best score for each initial piece (can be weighted differently)
-                best_score = weights[3] * by_score_2[0][1] + weights[4] * score
-                # append initial piece plus potential score to final_choices
-                final_choices.append((piece, best_score))
-            # if there are no possible moves left, add the first played piece to the final_choices list
-            else:
-                final_choices.append((piece, score))
-
-        toc = time.perf_counter()
-        print(f"minimax calculation: {toc - tic} seconds")
-        # sort the list of final_choices by score
-        final_choices = sorted(final_choices, key=lambda move: move[1], reverse=True)
-        # return the highest scoring move
-        return final_choices[0][0]
-
-    # if there are no possible moves left, return None
-    else:
-        return None
+    """
+    Takes in a Player object and Game object and returns the placement found best
+    by a paranoid search, which assumes all opponents play against the player.
+    If no placement can be made, function should return None.
+    """
+    return search_move(player, game, weights, "paranoid")
+
+
+def maxn_player(player, game, weights):
+    """
+    Takes in a Player object and Game object and returns the placement found best
+    by a max-n search, which assumes every player plays for itself.
+    If no placement can be made, function should return None.
+    """
+    return search_move(player, game, weights, "maxn")
+
+
+def search_move(player, game, weights, mode):
+    # a placement from the player's opening book needs no search
+    booked = book_move(player, game)
+    if booked is not None:
+        return booked
+
+    depth = weights[5] if len(weights) > 5 else DEPTH
+    width = weights[6] if len(weights) > 6 else WIDTH
+    workers = weights[7] if len(weights) > 7 else 1
+    seconds = weights[8] if len(weights) > 8 else 0
+    deadline = time.perf_counter() + seconds if seconds else None
+    solved = endgame_move(player, game, weights[9] if len(weights) > 9 else 0, seconds)
+    if solved is not None:
+        return solved
+    config = (tuple(weights), player.evaluator)
+    (kept, table) = TABLES.get((player.label, mode), (None, None))
+    if kept != config:
+        table = TranspositionTable()
+        TABLES[(player.label, mode)] = (config, table)
+    search = Search(weights, depth, width, mode, table, workers, seconds, player.evaluator)
+
+    (hits, misses) = (table.hits, table.misses)
+    with game.metrics.timer("minimax.calculation"):
+        piece = search.best_move(player, game, deadline)
+    game.metrics.count("search.nodes", search.nodes)
+    game.metrics.count("search.table_hits", table.hits - hits)
+    game.metrics.count("search.table_misses", table.misses - misses)
+    return piece
 
 
 # For a particular placement $i$, we assign weights $W_0$, $W_1$, $W_2$, $W_3$, $W_4$ such that:
 #
-# $ size_{j,i} $ = size of $j$th placement
-#
-# $ cor_{j,my} $ = number of my corners at $j$th placement
+# $ size_i $ = size of placement
 #
-# $ cor_{j,opp} $ = number of opponent's corners at $j$th placement
+# $ cor_{my} $, $ cor_{opp} $ = number of my corners and of an opponent's corners after the placement
 #
 # $ n_{opp} $ = number of opponents
 #
-# $ W_2 $ = number of best placements from initial move that are chosen to run Minimax
+# $ W_2 $ = number of best placements that are searched from the first move
+#
+# $ V_i $ = value of the position reached by searching below the placement, where a position
+# is worth $ W_0 (score_{my} - \overline{score_{opp}}) + W_1 (cor_{my} - \overline{cor_{opp}}) $
 #
 # then:
 #
-# $ MinimaxEval_{W_2, i} = W_4 \left [ size_{1,i} W_1 + \frac{\sum{(cor_{1,my} - cor_{1,opp})}}{n_{opp}} W_2 \right ]
-# + W_3 \left [ size_{2,i} W_1 + \frac{\sum{(cor_{2,my} - cor_{2,opp})}}{n_{opp}} W_2 \right ]$
+# $ MinimaxEval_{W_2, i} = W_4 \left [ size_i W_0 + \frac{\sum{(cor_{my} - cor_{opp})}}{n_{opp}} W_1 \right ]
+# + W_3 V_i $
@@ -0,0 +1,378 @@
+import concurrent.futures
+import math
+import multiprocessing
+import time
+from objects.player import eval_moves
+from objects.state import pack, unpack, warm
+from objects.zobrist import TranspositionTable
+
+# Pools of worker processes, by number of workers, kept from one move to the next.
+EXECUTORS = {}
+
+
+# Here we implement a depth-limited search over the placements of every
+# player in turn. Moves are played on the game's own board and players
+# through apply and taken back with undo, so no copies of the game are made.
+#
+# Two ways of handling the opponents are offered:
+#
+# - "paranoid": every opponent is assumed to play against the searching
+#   player, which turns the game into a two-sided one that alpha-beta
+#   pruning can cut down.
+# - "maxn": every player is assumed to maximize its own value, and the
+#   search backs up a vector with one value per player.
+#
+# At every node the placements are ordered by their eval_move score and
+# only the best few are searched, so the cost of the search is set by its
+# depth and width rather than by the number of legal placements.
+#
+# Placements commute, so the same position is often reached again through
+# placements made in another order. Results are kept in a transposition
+# table keyed by the board's Zobrist key and the player to move, along with
+# the best placement found, which is searched first when the position is
+# seen again. A table may be kept across searches, but only by searches for
+# the same player, mode and weights, since the values depend on them.
+#
+# A board that tracks its territory (see objects/territory.py) lets the
+# search pass over players with no cell left to cover without generating
+# their placements.
+#
+# The placements searched at the root are independent of one another, so
+# they can be spread over a pool of worker processes, each of which rebuilds
+# the game from its packed state (see objects/state.py) and fills the move
+# caches of its players before searching. A deadline bounds the time a move
+# may take: placements not searched by then are left out, along with the one
+# whose search it cut off, which raises Timeout at the node it reached and
+# takes back every placement on the way up. A move with a
+# deadline is searched by a pool of its own, stopped at the deadline, so no
+# search still running then holds a worker into the next move.
+
+class Timeout(Exception):
+    """
+    Raised when a search runs past its deadline.
+    """
+
+
+class Search:
+    """
+    A search of the given depth (in placements, counting every player)
+    and width (number of best placements searched at each node), in
+    "paranoid" or "maxn" mode. weights[0] and weights[1] are the weights
+    of eval_move; weights[2] is the number of placements searched at the
+    root, weights[3] how important the searched value of a root placement
+    is and weights[4] how important its own eval_move score is.
+    The root placements are searched by the given number of worker
+    processes, and only those searched within the given number of
+    seconds (if any) are considered. Placements of every player are
+    ordered by the given Evaluator, if any, instead of eval_move.
+    """
+
+    def __init__(self, weights, depth, width, mode="paranoid", table=None, workers=1, seconds=None,
+                 evaluator=None):
+        assert (mode in ["paranoid", "maxn"])
+        self.weights = weights
+        self.depth = depth
+        self.width = width
+        self.mode = mode
+        self.table = table if table is not None else TranspositionTable()
+        self.workers = workers
+        self.seconds = seconds
+        self.evaluator = evaluator
+        self.nodes = 0
+        # time.perf_counter value past which a search in this process raises Timeout
+        self.deadline = None
+
+    def start(self, player, game):
+        """
+        Prepares a search of the game for the player.
+        """
+        self.game = game
+        # the players in the order they will move, starting with the player
+        start = [p.label for p in game.players].index(player.label)
+        self.order = game.players[start:] + game.players[:start]
+        self.table.new_search()
+
+    def best_move(self, player, game, deadline=None):
+        """
+        Returns the best placement (Shape object) for the player,
+        or None if the player cannot place any piece. The search stops
+        at the deadline (a time.perf_counter value) if one is given, and
+        after the search's seconds otherwise.
+        """
+        self.start(player, game)
+        if deadline is None and self.seconds:
+            deadline = time.perf_counter() + self.seconds
+        self.deadline = deadline
+
+        # search the best placement of an earlier search of this position first
+        entry = self.table.probe(game.board.state_key(player.label))
+        by_score = self.ordered(player, entry[4] if entry is not None else None)[:self.weights[2]]
+        if not by_score:
+            return None
+
+        if deadline is not None and time.perf_counter() > deadline:
+            # no time left to search any placement
+            values = []
+        elif self.workers > 1:
+            values = self.parallel_values(player, by_score, deadline)
+        else:
+            values = []
+            for (piece, score) in by_score:
+                # a placement only needs an exact value if it can beat the best one so far
+                alpha = -math.inf
+                if values and self.weights[3] > 0:
+                    alpha = (max(values) - self.weights[4] * score) / self.weights[3]
+                try:
+                    value = self.root_value(player, piece, alpha)
+                except Timeout:
+                    break
+                values.append(self.weights[3] * value + self.weights[4] * score)
+                if deadline is not None and time.perf_counter() > deadline:
+                    break
+
+        # placements left unsearched by the deadline are not considered,
+        # unless none was searched and the best scoring one is all there is
+        if not values:
+            return by_score[0][0]
+        best = max(range(len(values)), key=lambda i: values[i])
+        return by_score[best][0]
+
+    def root_value(self, player, piece, alpha=-math.inf):
+        """
+        Returns the searched value for the player of a placement at the root.
+        """
+        self.play(player, piece)
+        try:
+            if self.mode == "paranoid":
+                return self.paranoid(self.depth - 1, 1, 0, alpha, math.inf)
+            return self.maxn(self.depth - 1, 1, 0)[0]
+        finally:
+            self.take_back(player)
+
+    def parallel_values(self, player, by_score, deadline):
+        """
+        Returns the combined values of the root placements, searched by a
+        pool of worker processes, in order and up to the first placement
+        whose search had not finished by the deadline.
+        """
+        state = pack(self.game)
+        jobs = [(state, player.label, piece, self.weights, self.depth, self.width, self.mode, self.evaluator)
+                for (piece, score) in by_score]
+        if deadline is None:
+            if self.workers not in EXECUTORS:
+                EXECUTORS[self.workers] = concurrent.futures.ProcessPoolExecutor(self.workers)
+            results = list(EXECUTORS[self.workers].map(search_root, *zip(*jobs)))
+        else:
+            results = timed_results(jobs, self.workers, deadline)
+
+        values = []
+        for (value, nodes), (piece, score) in zip(results, by_score):
+            self.nodes += nodes
+            values.append(self.weights[3] * value + self.weights[4] * score)
+        return values
+
+    def ordered(self, player, first=None):
+        """
+        Returns the placements of the player as a list of (piece, score)
+        tuples, sorted by their eval_move score, with the placement
+        covering the points of first (if any) moved to the front.
+        """
+        if player.finished:
+            return []
+        territory = self.game.board.territory
+        if territory is not None and not territory.reach.get(player.label, True):
+            # no cell left that the player could cover
+            return []
+        possibles = player.possible_moves(player.pieces, self.game)
+        by_score = eval_moves(possibles, player, self.game, self.weights, self.evaluator)
+        by_score = sorted(by_score, key=lambda move: move[1], reverse=True)
+        if first is not None:
+            for i, (piece, score) in enumerate(by_score):
+                if piece.points == first:
+                    by_score.insert(0, by_score.pop(i))
+                    break
+        return by_score
+
+    def play(self, player, piece):
+        """
+        Places a piece for a player in place and moves the game on a turn.
+        """
+        self.game.board.apply(player, piece)
+        player.apply(piece, self.game.board)
+        self.game.rounds += 1
+        self.nodes += 1
+
+    def take_back(self, player):
+        """
+        Takes back the most recent placement made through play.
+        """
+        self.game.rounds -= 1
+        player.undo()
+        self.game.board.undo()
+
+    def values(self):
+        """
+        Returns the value of the position for every player in search order:
+        weights[0] times the player's score minus the mean score of its
+        opponents, plus weights[1] times the same difference of free corners.
+        """
+        board = self.game.board
+        scores = [p.score for p in self.order]
+        corners = [len(p.free_corners(board)) for p in self.order]
+        n = len(self.order)
+
+        def relative(values, i):
+            return values[i] - (sum(values) - values[i]) / max(n - 1, 1)
+
+        return [self.weights[0] * relative(scores, i) + self.weights[1] * relative(corners, i) for i in range(n)]
+
+    def paranoid(self, depth, turn, passes, alpha, beta):
+        """
+        Returns the value of the position for the searching player, assuming
+        that every opponent plays to minimize it, with alpha-beta pruning.
+        turn is the number of placements since the root and passes the
+        number of players in a row that could not move.
+        """
+        if passes == len(self.order):
+            return self.values()[0]
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise Timeout()
+
+        mover = self.order[turn % len(self.order)]
+        key = self.game.board.state_key(mover.label)
+        entry = self.table.probe(key)
+        first = None
+        if entry is not None:
+            (_, stored_depth, stored, flag, first, _) = entry
+            if stored_depth >= depth:
+                if flag == TranspositionTable.EXACT:
+                    return stored
+                if flag == TranspositionTable.LOWER:
+                    alpha = max(alpha, stored)
+                else:
+                    beta = min(beta, stored)
+                if alpha >= beta:
+                    return stored
+
+        if depth == 0:
+            value = self.values()[0]
+            self.table.store(key, 0, value)
+            return value
+
+        moves = self.ordered(mover, first)[:self.width]
+        if not moves:
+            self.game.rounds += 1
+            try:
+                return self.paranoid(depth - 1, turn + 1, passes + 1, alpha, beta)
+            finally:
+                self.game.rounds -= 1
+
+        maximizing = (mover is self.order[0])
+        (alpha_0, beta_0) = (alpha, beta)
+        value = -math.inf if maximizing else math.inf
+        best = None
+        for (piece, score) in moves:
+            self.play(mover, piece)
+            try:
+                child = self.paranoid(depth - 1, turn + 1, 0, alpha, beta)
+            finally:
+                self.take_back(mover)
+            if maximizing and child > value:
+                (value, best) = (child, piece)
+                alpha = max(alpha, value)
+            elif not maximizing and child < value:
+                (value, best) = (child, piece)
+                beta = min(beta, value)
+            if alpha >= beta:
+                break
+
+        # the value is only a bound if it fell outside the window it was searched with
+        if value <= alpha_0:
+            flag = TranspositionTable.UPPER
+        elif value >= beta_0:
+            flag = TranspositionTable.LOWER
+        else:
+            flag = TranspositionTable.EXACT
+        self.table.store(key, depth, value, flag, best.points)
+        return value
+
+    def maxn(self, depth, turn, passes):
+        """
+        Returns the values of the position for every player in search order,
+        assuming that every player plays to maximize its own value.
+        """
+        if passes == len(self.order):
+            return self.values()
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise Timeout()
+
+        index = turn % len(self.order)
+        mover = self.order[index]
+        key = self.game.board.state_key(mover.label)
+        entry = self.table.probe(key)
+        first = None
+        if entry is not None:
+            if entry[1] >= depth:
+                return entry[2]
+            first = entry[4]
+
+        if depth == 0:
+            values = self.values()
+            self.table.store(key, 0, values)
+            return values
+
+        moves = self.ordered(mover, first)[:self.width]
+        if not moves:
+            self.game.rounds += 1
+            try:
+                return self.maxn(depth - 1, turn + 1, passes + 1)
+            finally:
+                self.game.rounds -= 1
+
+        best = None
+        for (piece, score) in moves:
+            self.play(mover, piece)
+            try:
+                values = self.maxn(depth - 1, turn + 1, 0)
+            finally:
+                self.take_back(mover)
+            if best is None or values[index] > best[0][index]:
+                best = (values, piece)
+
+        self.table.store(key, depth, best[0], TranspositionTable.EXACT, best[1].points)
+        return best[0]
+
+
+def search_root(state, label, piece, weights, depth, width, mode, evaluator=None):
+    """
+    Searches a placement at the root in a worker process, from the packed
+    state of the game, and returns its value and the number of nodes searched.
+    """
+    game = unpack(state)
+    warm(game)
+    player = [p for p in game.players if p.label == label][0]
+    search = Search(weights, depth, width, mode, evaluator=evaluator)
+    search.start(player, game)
+    return search.root_value(player, piece), search.nodes
+
+
+def timed_results(jobs, workers, deadline):
+    """
+    Returns the results of search_root for the jobs, searched by a pool of
+    the given number of worker processes, in order and up to the first job
+    whose search had not finished by the deadline. The pool is stopped at
+    the deadline.
+    """
+    pool = multiprocessing.Pool(workers)
+    try:
+        pending = [pool.apply_async(search_root, job) for job in jobs]
+        results = []
+        for result in pending:
+            result.wait(max(deadline - time.perf_counter(), 0))
+            if not result.ready():
+                break
+            results.append(result.get())
+        return results
+    finally:
+        pool.terminate()
+        pool.join()
@@ -21,10 +21,10 @@ def user_player(player, game, weights):
         print("\nSorry! You can't play any more moves since you have placed all your pieces.\n")
         return None
 
-    possibles = player.possible_moves(player.pieces, game)
     options = []
 
-    if not possibles:
+    # only the first placement is needed to know whether the player can move
+    if next(player.iter_moves(player.pieces, game), None) is None:
         print("\nSorry! There are no more possible moves for you.\n")
         return None
 
@@ -44,8 +44,9 @@ def user_player(player, game, weights):
             print("\nIt appears the point you chose overlaps with another piece! Please choose an empty square.\n")
             reference_pt = get_input()
 
-        for piece in possibles:
-            if piece.ID == shape and piece.points[0][0] == reference_pt[0] and piece.points[0][1] == reference_pt[1]:
+        chosen = [p for p in player.pieces if p.ID == shape]
+        for piece in player.iter_moves(chosen, game):
+            if piece.points[0][0] == reference_pt[0] and piece.points[0][1] == reference_pt[1]:
                 options.append(piece)
 
         if not options: